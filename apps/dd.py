@@ -2,14 +2,11 @@
 # -*- coding: utf-8 -*-
 """ AutoDD: Automatically does the so called Due Diligence for you. """
 import argparse
-import pandas as pd
-from warnings import warn
 from time import time
-from datetime import datetime, timedelta
+from datetime import timedelta
 from autodd.Proxies import Proxies
-from autodd.Financials import Financials
-from autodd.Submissions import SubmissionsPsaw, SubmissionsPraw, SubmissionsHybrid
-from autodd.scores import get_ticker_scores, gen_delta_df, filter_df, print_df
+from autodd.Pipeline import Pipeline
+from autodd.scores import print_df
 
 
 def gen_dd_table():
@@ -28,9 +25,27 @@ def gen_dd_table():
     parser.add_argument('--maxprice', nargs='?', const=9999999, type=int, default=9999999,
                         help='Filter out results more than the max price set, default is 9999999.')
 
+    parser.add_argument('--top', nargs='?', type=int, default=None,
+                        help='Only keep the top results as per the sort column. Advanced yahoo finance information is '
+                        'only retrieved for those.')
+
     parser.add_argument('--advanced', default=False, action='store_true',
                         help='Using this parameter shows advanced yahoo finance information on the ticker.')
 
+    parser.add_argument('--columns', nargs='?', type=str, default=None,
+                        help='Comma-separated list of financial columns to output, eg "Industry,beta,Trgtmean". Only '
+                        'the yahoo data needed for those columns is downloaded. Overrides --advanced.')
+
+    parser.add_argument('--title-only', action='store_true', dest='title_only',
+                        help='Only search submission titles for tickers; the submission text is not downloaded.')
+
+    parser.add_argument('--comments', default=False, action='store_true',
+                        help='Also score tickers mentioned in comments (db=psaw or db=hybrid only).')
+
+    parser.add_argument('--progressive', default=False, action='store_true',
+                        help='Write a live table (to filename_live) as soon as the scores are computed, and refresh '
+                        'it as financial stats arrive; the top tickers are completed first.')
+
     parser.add_argument('--sort', nargs='?', const=1, type=int, default=1,
                         help='Sort output by descending order of 1: total score, 2: recent score, 3: previous score, '
                         '4: change in score, 5: # of rocket emojis.')
@@ -53,6 +68,10 @@ def gen_dd_table():
     parser.add_argument('--cred_file', nargs='?', type=str, default=None,
                         help='Provide a file containing praw credentials. Required if db=praw or db=hybrid.')
 
+    parser.add_argument('--cache_file', nargs='?', type=str, default=None,
+                        help='Optionally provide a file in which to keep the tickers extracted from each submission, '
+                        'so that submissions already seen in previous runs are not rescanned.')
+
     start = time()
 
     args = parser.parse_args()
@@ -60,33 +79,23 @@ def gen_dd_table():
     # get a list of proxies from proxy file
     proxies = Proxies(args.proxy_file)
 
-    print("Getting submissions and generating scores dataframe...")
+    columns = args.columns.split(',') if args.columns else None
+    text_fields = ('title',) if args.title_only else ('title', 'selftext')
 
-    # get submissions and computer scores
-    recent, prev = get_submissions(args.interval, args.sub, args.db, proxies, args.cred_file)
+    on_update = None
+    if args.progressive:
+        live_filename = 'output\\' + args.filename + '_live'
+        print("Live table: " + live_filename + ('.csv' if args.csv else '.txt'))
 
-    current_scores_df, current_rockets_df = get_ticker_scores(recent, ['🚀'])
-    prev_scores_df, prev_rockets_df = get_ticker_scores(prev, ['🚀'])
+        def on_update(partial_df):
+            print_df(partial_df.copy(), live_filename, args.csv, mode='w', verbose=False)
 
-    # populate score dataframe
-    results_df = gen_delta_df(current_scores_df, prev_scores_df, args.interval)
-    if len(current_scores_df) > 1:
-        totals = current_scores_df.add(prev_scores_df, fill_value=0).astype('int32')
-        results_df = pd.concat([results_df, totals], axis=1)
-
-    results_df = filter_df(results_df, args.min)
-
-    # count rockets
-    rockets_df = current_rockets_df.add(prev_rockets_df, fill_value=0).astype('int32')
-    results_df.insert(loc=4, column='Rockets', value=rockets_df)
-    results_df = results_df.fillna(value=0)
-
-    print("Getting financial stats...")
-    financials = Financials(threads=args.threads)
-    results_df = financials.get_financial_stats(results_df, args.advanced)
-
-    # Sort by Total (sort = 1), Recent ( = 2), Prev ( = 3), Change ( = 4), Rockets ( = 5)
-    results_df.sort_values(by=results_df.columns[args.sort - 1], inplace=True, ascending=False)
+    with Pipeline(db=args.db, proxies=proxies, praw_cred_file=args.cred_file, threads=args.threads,
+                  cache_file=args.cache_file) as pipeline:
+        print("Getting submissions, generating scores dataframe and getting financial stats...")
+        results_df = pipeline.run(interval=args.interval, sub=args.sub, min_score=args.min, advanced=args.advanced,
+                                  sort=args.sort, max_price=args.maxprice, top=args.top, columns=columns,
+                                  text_fields=text_fields, comments=args.comments, on_update=on_update)
 
     print_df(results_df, 'output\\' + args.filename, args.csv)
     total_time = str(timedelta(seconds=round(time() - start)))
@@ -94,48 +103,5 @@ def gen_dd_table():
     print("Dataframe has {} rows".format(len(results_df.index)))
 
 
-def get_submissions(n, sub, db='psaw', proxies=None, praw_cred_file=None):
-    """
-    Returns two dictionaries:
-    1st dictionary: current result from n hours ago until now
-    2nd dictionary: prev result from 2n hours ago until n hours ago
-    The two dictionaries' keys are the requested subreddit: all subreddits if allsub is True, and just "sub" otherwise
-    The value paired with each subreddit key is a generator which traverses each submission
-     """
-
-    if db == 'psaw':
-        submissions_api = SubmissionsPsaw(sub=sub, proxies=proxies)
-    elif db == 'praw':
-        submissions_api = SubmissionsPraw(sub=sub, credentials_file=praw_cred_file, proxies=proxies)
-    elif db == 'hybrid':
-        submissions_api = SubmissionsHybrid(sub=sub, credentials_file=praw_cred_file, proxies=proxies)
-    else:
-        raise ValueError("Invalid db '{}'. Valid choices:\npsaw, praw, hybrid".format(db))
-
-    mid_interval = datetime.today() - timedelta(hours=n)
-    ts_mid = int(mid_interval.timestamp())
-    ts_start = int((mid_interval - timedelta(hours=n)).timestamp())
-    ts_end = int(datetime.today().timestamp())
-
-    search_filter = ['title', 'link_flair_text', 'selftext', 'score']
-    sanity = ['wallstreetbets', 'wallstreetbetsELITE', 'SatoshiStreetBets']
-    recent = submissions_api.get_submissions(start=ts_mid, end=ts_end, search_filter=search_filter,
-                                             sanity_list=sanity)
-    prev = submissions_api.get_submissions(start=ts_start, end=ts_mid, search_filter=search_filter,
-                                           sanity_list=sanity)
-
-    if all(value == [] for value in prev.values()):
-        raise Exception('No results for the previous time period.')
-    elif not recent:
-        raise Exception('No results for the recent time period.')
-
-    for subreddit in prev:
-        if not prev[subreddit]:
-            warn('No results for the previous time period in {} subreddit.'.format(subreddit))
-        if not recent[subreddit]:
-            warn('No results for the recent time period in {} subreddit.'.format(subreddit))
-
-    return recent, prev
-
 if __name__ == '__main__':
     gen_dd_table()
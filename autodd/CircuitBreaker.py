@@ -0,0 +1,47 @@
+from threading import Lock
+from time import monotonic
+
+
+class CircuitBreaker:
+    """
+    Fails fast when a server is clearly down: after max_failures consecutive failed requests the circuit opens, and
+    requests are refused for reset_timeout seconds. A single trial request is then let through (half-open): the circuit
+    closes again if it succeeds, and reopens for another reset_timeout if it fails.
+    """
+
+    def __init__(self, max_failures=5, reset_timeout=30):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """
+        Returns whether a request may be performed; every allowed request must be followed by success() or failure()
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                self.opened_at = monotonic()
+                self._trial = False
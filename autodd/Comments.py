@@ -0,0 +1,122 @@
+from .utils import gen_slices, localtime
+from .Submissions import SubmissionsPsaw, SubmissionsHybrid
+from warnings import warn
+from queue import Queue, Full
+from threading import Event
+
+
+class Comments:
+    """
+    Comment source for the pushshift-backed submission apis (SubmissionsPsaw, SubmissionsHybrid): uses the same
+    subreddits, proxies (and their apis) and executor.
+
+    Comments are one to two orders of magnitude more numerous than submissions, so they are never materialised: each
+    time slice is traversed in its own thread, and batches of comments are handed to the consumer through a bounded
+    queue. At most (max_batches + number of proxies) * batch_size comments are held in memory at any time.
+    """
+
+    def __init__(self, submissions_api, batch_size=1000, max_batches=8):
+        if not isinstance(submissions_api, (SubmissionsPsaw, SubmissionsHybrid)):
+            raise ValueError("Comments require a pushshift-backed submissions api (psaw or hybrid).")
+        self.submissions_api = submissions_api
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+    def get_comments(self, start, end, search_filter):
+        """
+        Returns a dictionary whose keys are the subreddits and whose values are generators of the comments between
+        start and end (as records holding the search_filter fields). Each generator only fetches its comments
+        as it is traversed, and should be traversed only once.
+        """
+        if 'created_utc' not in search_filter:
+            search_filter.append('created_utc')
+
+        self.submissions_api.reset_proxy_health()
+
+        return {subreddit: self.stream_comments(start, end, subreddit, search_filter)
+                for subreddit in self.submissions_api.subreddit_dict}
+
+    def stream_comments(self, start, end, subreddit, search_filter):
+        """
+        Generator of the comments between start and end, time-sliced over the healthy proxies. If a slice fails part
+        way, what remains of it is streamed again over the remaining proxies; if none is left, it is skipped.
+        """
+        api = self.submissions_api
+        api_indices = sorted(api.healthy_api_indices)
+        if not api_indices:
+            warn("{}: no healthy proxy left to fetch comments from {} to {}.".format(subreddit, localtime(start),
+                                                                                      localtime(end)))
+            return
+
+        # what search_comments argument would be if multi-threading not performed
+        arg_dict = {'after': start, 'before': end, 'subreddit': subreddit, 'filter': search_filter}
+
+        # generate time-sliced arguments
+        arg_dict_list = gen_slices(len(api_indices), arg_dict)
+
+        batch_queue = Queue(maxsize=self.max_batches)
+        stop = Event()
+        futures = [api.executor.submit(self.produce_batches, api_index, slice_arg_dict, search_filter, batch_queue,
+                                       stop) for api_index, slice_arg_dict in zip(api_indices, arg_dict_list)]
+
+        # each producer puts its batches, then the (after, before) interval it could not retrieve (or None)
+        failed_slices = []
+        try:
+            remaining = len(futures)
+            while remaining:
+                item = batch_queue.get()
+                if isinstance(item, list):
+                    yield from item
+                else:
+                    remaining -= 1
+                    if item is not None:
+                        failed_slices.append(item)
+        finally:
+            # unblocks the producers if the consumer stopped early
+            stop.set()
+            for future in futures:
+                future.result()
+
+        for after, before in failed_slices:
+            yield from self.stream_comments(after, before, subreddit, search_filter)
+
+    def produce_batches(self, api_index, arg_dict, search_filter, batch_queue, stop):
+        """
+        Traverses one time slice using the api (ie proxy) at api_index, putting batches of comments in batch_queue
+        """
+        api = self.submissions_api
+        before = arg_dict['before']
+        batch = []
+        failed_slice = None
+        try:
+            for comment in api.api_list[api_index].search_comments(**arg_dict):
+                batch.append(comment)
+                if len(batch) == self.batch_size:
+                    # comments are retrieved in descending order: anything older than this batch is still to fetch
+                    before = batch[-1].created_utc
+                    if not self.put(batch_queue, api.to_records(batch, search_filter), stop):
+                        return
+                    batch = []
+            if batch:
+                self.put(batch_queue, api.to_records(batch, search_filter), stop)
+        except Exception as exception:
+            s, e = localtime(arg_dict['after']), localtime(before)
+            warn("{}: comment search from {} to {} failed on proxy {}: {}".format(arg_dict['subreddit'], s, e,
+                                                                                  api_index, exception))
+            api.healthy_api_indices.discard(api_index)
+            failed_slice = (arg_dict['after'], before)
+        finally:
+            self.put(batch_queue, failed_slice, stop)
+
+    @staticmethod
+    def put(batch_queue, item, stop):
+        """
+        Puts item in batch_queue, waiting for room unless the consumer has stopped. Returns False if it has.
+        """
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=1)
+                return True
+            except Full:
+                pass
+        return False
@@ -0,0 +1,61 @@
+import requests
+import warnings
+from collections import namedtuple
+from time import sleep
+from psaw import PushshiftAPI
+from .utils import fastjson
+from .RateLimiter import RateLimiter
+
+
+class FastPushshiftAPI(PushshiftAPI):
+    """
+    PushshiftAPI which reuses one http client, decodes responses straight from the raw bytes and wraps each result
+    without deep-copying it or creating a new namedtuple type per result. Requests go through rate_limiter (shared
+    with other fetchers), whose pushshift rate is set to the one advertised by the server; it replaces psaw's own rate
+    limiting.
+    """
+
+    def __init__(self, r=None, *args, rate_limiter=None, **kwargs):
+        # _get is already used by the parent constructor (to query the rate limit), so these must exist first
+        self.session = requests.Session()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self._thing_types = {}
+        super().__init__(r, *args, **kwargs)
+
+        self.rate_limiter.set_rate(self.base_url, self._rlcache.n / 60, self.proxies.get('https', ''))
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, url, payload={}):
+        i, success = 0, False
+        while (not success) and (i < self.max_retries):
+            if i > 0:
+                warnings.warn("Unable to connect to pushshift.io. Retrying after backoff.")
+                sleep(min(self.backoff * i, self.max_sleep))
+            i += 1
+            try:
+                response = self.rate_limiter.call(url, self.proxies.get('https', ''), self.session.get, url,
+                                                  params=payload, proxies=self.proxies)
+            except requests.ConnectionError:
+                continue
+            success = response.status_code == 200
+            if not success:
+                warnings.warn("Got non 200 code %s" % response.status_code)
+        if not success:
+            raise Exception("Unable to connect to pushshift.io. Max retries exceeded.")
+        return fastjson.loads(response.content)
+
+    def _wrap_thing(self, thing, kind):
+        """Mimic praw.Submission and praw.Comment API"""
+        thing['created'] = self._epoch_utc_to_local(thing['created_utc'])
+
+        # results are never modified downstream, so a shallow copy is enough
+        thing['d_'] = dict(thing)
+
+        # all results of a request share the same fields (those in the filter), hence the same type
+        key = (kind, tuple(thing))
+        thing_type = self._thing_types.get(key)
+        if thing_type is None:
+            thing_type = self._thing_types[key] = namedtuple(kind, key[1])
+        return thing_type(*thing.values())
@@ -1,26 +1,252 @@
 import requests
 import pandas as pd
 from numbers import Number
-from concurrent.futures import ThreadPoolExecutor
-from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from collections import deque
+from itertools import repeat, cycle
 from os import cpu_count
+from random import uniform
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+from warnings import warn
+from .utils import fastjson
+from .RateLimiter import RateLimiter
+from .CircuitBreaker import CircuitBreaker
 
 
 class FastYahoo:
 
-    def __init__(self, threads=True):
-        if threads:
-            self.executor = ThreadPoolExecutor(max_workers=cpu_count()*2)
+    # number of recent latencies per host from which the hedging threshold is computed, and the minimum needed
+    latency_window = 200
+    min_latency_samples = 20
+
+    def __init__(self, threads=True, executor=None, rate_limiter=None, max_retries=3, backoff=0.5, timeout=10,
+                 hedge_percentile=95, max_failures=5, reset_timeout=30, proxies=None):
+        """
+        executor: optional executor shared with the caller; it is used as is and not shut down by close(). If not
+        provided and threads is True, a private executor is created and owned by this instance.
+        rate_limiter: optional RateLimiter shared with other fetchers; if not provided, that of proxies is used, or a
+        private one is created.
+        proxies: optional Proxies; requests are spread over its proxies in turn, each with its own connection pool,
+        rate limit and circuit breaker. Requests are direct if not provided.
+        max_retries, backoff: a request failing with a connection error, a timeout (in seconds), a 429 or a 5xx is
+        retried up to max_retries times, after a random delay of up to backoff * 2**attempt seconds.
+        hedge_percentile: a request still pending beyond this percentile of recent latencies to the same host is
+        duplicated, and the first response is used (None, or no threads, disables hedging).
+        max_failures, reset_timeout: after max_failures consecutive failed requests to a host through a proxy, requests
+        to it through that proxy fail straight away (leaving N/A stats) for reset_timeout seconds.
+        """
+        self.proxy_list = proxies.proxy_list if proxies is not None else ['']
+
+        self._owns_executor = False
+        if executor is not None:
+            self.executor = executor
+            self._map = self.executor.map
+        elif threads:
+            self.executor = ThreadPoolExecutor(max_workers=cpu_count()*2*len(self.proxy_list))
+            self._owns_executor = True
             self._map = self.executor.map
         else:
+            self.executor = None
             self._map = map
 
-    def download_advanced_stats(self, symbol_list, module_name_map):
+        # one http client per proxy, so that connections to yahoo through each proxy are pooled and reused across calls
+        self.sessions = []
+        for proxy in self.proxy_list:
+            session = requests.Session()
+            if proxy:
+                session.proxies = {'http': proxy, 'https': proxy}
+            self.sessions.append(session)
+        self._proxy_indices = cycle(range(len(self.proxy_list)))
+
+        if rate_limiter is None:
+            rate_limiter = proxies.rate_limiter if proxies is not None else RateLimiter()
+        self.rate_limiter = rate_limiter
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._latencies = {}
+        self._lock = Lock()
+
+        # requests run in their own executor when hedged, so that the caller can wait on them with a timeout; there is
+        # no hedging without threads
+        self._hedge_executor = None
+        if self.executor is None:
+            self.hedge_percentile = None
+        if self.hedge_percentile is not None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=cpu_count()*4*len(self.proxy_list))
+
+    def close(self):
+        """
+        Releases the http clients and, if owned by this instance, the executor.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+            self._owns_executor = False
+        if self._hedge_executor is not None:
+            # hedges which lost the race are not waited for
+            self._hedge_executor.shutdown(wait=False)
+            self._hedge_executor = None
+        for session in self.sessions:
+            session.close()
+
+    def breaker(self, url, proxy_index=0):
+        """
+        Returns the circuit breaker of the host of url through the proxy at proxy_index
+        """
+        key = (urlsplit(url).hostname, proxy_index)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.max_failures, self.reset_timeout)
+            return self._breakers[key]
+
+    def next_proxy(self, url, exclude=None):
+        """
+        Returns the index of the next proxy in turn whose circuit to the host of url is not open, or None if there is
+        none. The proxy at index exclude is skipped, unless it is the only one.
+        """
+        for _ in range(len(self.proxy_list)):
+            proxy_index = next(self._proxy_indices)
+            if proxy_index == exclude and len(self.proxy_list) > 1:
+                continue
+            if self.breaker(url, proxy_index).allow():
+                return proxy_index
+        return None
+
+    def get(self, url, params):
+        """
+        GET request to yahoo through the next proxy, resilient to transient failures: retried with jittered exponential
+        backoff, hedged if slower than usual, and refused straight away while the circuits of all proxies are open. A
+        response that is not JSON (eg a proxy error page) counts as a failed attempt.
+        Returns the decoded JSON response, or None if the request failed, in which case the corresponding stats are N/A.
+        """
+        proxy_index = self.next_proxy(url)
+        if proxy_index is None:
+            return None
+        breaker = self.breaker(url, proxy_index)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                sleep(uniform(0, self.backoff * 2 ** (attempt - 1)))
+            try:
+                response = self.hedged_get(url, params, proxy_index)
+            except requests.RequestException as exception:
+                error = exception
+                continue
+            if response.status_code in (200, 404):
+                try:
+                    json_dict = fastjson.loads(response.content)
+                except ValueError:
+                    # eg an html error page served by the proxy
+                    error = 'response is not JSON'
+                    continue
+                breaker.success()
+                return json_dict
+            error = 'HTTP {}'.format(response.status_code)
+            if response.status_code != 429 and response.status_code < 500:
+                # not transient: retrying would fail the same way
+                break
+
+        breaker.failure()
+        warn("Yahoo request to {} failed: {}".format(url, error))
+        return None
+
+    def hedged_get(self, url, params, proxy_index):
+        """
+        Performs the request through the proxy at proxy_index; if it takes longer than hedge_percentile of recent
+        requests to the same host, a duplicate request is sent through the next other proxy whose circuit is not open,
+        and whichever responds successfully first is returned.
+        """
+        threshold = self.hedge_threshold(url)
+        if threshold is None:
+            return self.timed_get(url, params, proxy_index)
+
+        primary = self._hedge_executor.submit(self.timed_get, url, params, proxy_index)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        hedge_index = self.next_proxy(url, exclude=proxy_index)
+        if hedge_index is None:
+            return primary.result()
+        hedge = self._hedge_executor.submit(self.timed_get, url, params, hedge_index)
+
+        # the outcome of the hedge counts towards the circuit of its proxy, even if it loses the race
+        hedge_breaker = self.breaker(url, hedge_index)
+        hedge.add_done_callback(lambda future: self.report(hedge_breaker, future))
+
+        # the first successful response wins; otherwise the last one (or error) is returned
+        response, error = None, None
+        for future in as_completed([primary, hedge]):
+            try:
+                response = future.result()
+            except requests.RequestException as exception:
+                error = exception
+                continue
+            if response.status_code in (200, 404):
+                return response
+        if response is None:
+            raise error
+        return response
+
+    @staticmethod
+    def report(breaker, future):
+        """
+        Reports the outcome of the request performed by future to breaker
+        """
+        if not future.cancelled() and future.exception() is None and future.result().status_code in (200, 404):
+            breaker.success()
+        else:
+            breaker.failure()
+
+    def timed_get(self, url, params, proxy_index):
+        """
+        Performs the request through the proxy at proxy_index within the rate limit of its host through that proxy,
+        recording its latency if it succeeds
+        """
+        start = monotonic()
+        response = self.rate_limiter.call(url, self.proxy_list[proxy_index], self.sessions[proxy_index].get, url,
+                                          params=params, timeout=self.timeout)
+        if response.status_code < 400:
+            host = urlsplit(url).hostname
+            with self._lock:
+                if host not in self._latencies:
+                    self._latencies[host] = deque(maxlen=self.latency_window)
+                self._latencies[host].append(monotonic() - start)
+        return response
+
+    def hedge_threshold(self, url):
+        """
+        Returns the latency (in seconds) beyond which a request to the host of url is hedged, or None if requests to it
+        are not hedged (hedging disabled, or too few recent requests to estimate the latency distribution)
+        """
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            latencies = sorted(self._latencies.get(urlsplit(url).hostname, ()))
+        if len(latencies) < self.min_latency_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))]
+
+    def download_advanced_stats(self, symbol_list, module_name_map, on_update=None, update_every=20):
         """
         Downloads advanced yahoo stats for many tickers by doing one request per ticker.
+
+        on_update: optional callback, called with the stats dataframe of the tickers retrieved so far every update_every
+        tickers. Responses are processed in the order of symbol_list, so the first tickers are complete first.
         """
         # get raw responses
-        results = self._map(FastYahoo.get_ticker_stats, symbol_list, repeat(module_name_map))
+        results = self._map(self.get_ticker_stats, symbol_list, repeat(module_name_map))
+
+        columns = ['Symbol']
+        for stat_name_dict in module_name_map.values():
+            columns.extend(list(stat_name_dict.values()))
 
         # construct stats table from responses
         stats_table = []
@@ -33,10 +259,13 @@ class FastYahoo:
                 stats_list.extend(FastYahoo.retrieve_stats(retrieved_stats_dict, stat_name_dict))
             stats_table.append(stats_list)
 
-        columns = ['Symbol']
-        for stat_name_dict in module_name_map.values():
-            columns.extend(list(stat_name_dict.values()))
+            if on_update is not None and len(stats_table) % update_every == 0 and len(stats_table) < len(symbol_list):
+                on_update(FastYahoo.stats_df(stats_table, columns))
+
+        return FastYahoo.stats_df(stats_table, columns)
 
+    @staticmethod
+    def stats_df(stats_table, columns):
         financial_data_df = pd.DataFrame(stats_table, columns=columns)
         financial_data_df.set_index('Symbol', inplace=True)
 
@@ -47,7 +276,9 @@ class FastYahoo:
         Downloads select ("quick") stats for many tickers using minimal number of http requests. Splits the ticker list
         into groups of 1000 and performs one request per group. eg if list has 2350 tickers, will split into 2 groups of
         1000 tickers and one group with the remaining 350 tickers, and will get quick stats with only 3 http requests.
-        Only returns those tickers that are valid, thus can be used to validate tickers efficiently.
+        Only returns those tickers that are valid, thus can be used to validate tickers efficiently. The tickers of a
+        group whose request failed cannot be validated: they are returned with all their stats N/A.
+        Returns (stats_df, failed_symbols), where failed_symbols is the set of tickers whose request failed.
         """
         # through trial and error, 1179 was the max without returning an error, but that number feels too arbitrary
         max_params = 1000
@@ -55,47 +286,47 @@ class FastYahoo:
         # split symbol_list into chunks of size max_params
         request_symbol_lists = [symbol_list[i:i + max_params] for i in range(0, len(symbol_list), max_params)]
 
-        # get raw responses
-        results = self._map(FastYahoo.quick_stats_request, request_symbol_lists, repeat(list(quick_stats_dict.keys())))
+        # get responses, already reduced to the requested stats
+        results = self._map(self.quick_stats_request, request_symbol_lists, repeat(quick_stats_dict))
 
-        # construct stats table from responses
+        # construct stats table from responses; each row is one symbol (eg SIGL, AAPL)
         stats_table = []
-        for response_list in results:
-            # each iteration is one symbol; (eg SIGL, AAPL)
-            for retrieved_stats_dict in response_list:
-                symbol = retrieved_stats_dict['symbol']
-                stats_list = [symbol] + FastYahoo.retrieve_stats(retrieved_stats_dict, quick_stats_dict)
-                stats_table.append(stats_list)
+        failed_symbols = set()
+        for request_symbol_list, response_table in zip(request_symbol_lists, results):
+            if response_table is None:
+                warn("Could not get quick stats for {} tickers; their stats are N/A.".format(len(request_symbol_list)))
+                failed_symbols.update(request_symbol_list)
+                response_table = [[symbol] + ['N/A'] * len(quick_stats_dict) for symbol in request_symbol_list]
+            stats_table.extend(response_table)
 
         # construct dataframe
         columns = ['Symbol'] + list(quick_stats_dict.values())
         stats_df = pd.DataFrame(stats_table, columns=columns)
         stats_df.set_index('Symbol', inplace=True)
 
-        return stats_df
+        return stats_df, failed_symbols
 
     @staticmethod
     def retrieve_stats(retrieved_stats_dict, stat_name_dict):
+        if retrieved_stats_dict is None:
+            return ['N/A'] * len(stat_name_dict)
+
         stats_list = []
-        if retrieved_stats_dict is not None:
-            for stat_name in stat_name_dict.keys():
+        for stat_name in stat_name_dict:
+            stat = retrieved_stats_dict.get(stat_name)
+            if stat is None:
                 stat_val = 'N/A'
-                if stat_name in retrieved_stats_dict:
-                    stat = retrieved_stats_dict[stat_name]
-                    if isinstance(stat, dict):
-                        if stat:  # only if non-empty otherwise N/A
-                            stat_val = stat['raw']
-                    elif isinstance(stat, str) or isinstance(stat, Number):
-                        stat_val = stat
-                    else:
-                        raise TypeError('Expected dictionary, string or number.')
-                stats_list.append(stat_val)
-        else:
-            stats_list.extend(['N/A'] * len(stat_name_dict.keys()))
+            elif isinstance(stat, (str, Number)):
+                stat_val = stat
+            elif isinstance(stat, dict):
+                # only if non-empty otherwise N/A
+                stat_val = stat['raw'] if stat else 'N/A'
+            else:
+                raise TypeError('Expected dictionary, string or number.')
+            stats_list.append(stat_val)
         return stats_list
 
-    @staticmethod
-    def get_ticker_stats(symbol, module_name_map):
+    def get_ticker_stats(self, symbol, module_name_map):
         """
         Returns advanced stats for one ticker
         """
@@ -105,11 +336,10 @@ class FastYahoo:
         params = {
             'modules': ','.join(module_list),
         }
-        result = requests.get(url, params=params)
-        if result.status_code != 200 and result.status_code != 404:
-            result.raise_for_status()
+        json_dict = self.get(url, params)
+        if json_dict is None:
+            return None
 
-        json_dict = result.json()
         if "quoteSummary" not in json_dict:
             return None
         if json_dict['quoteSummary']['result'] is None:
@@ -118,27 +348,29 @@ class FastYahoo:
 
         return module_dict
 
-    @staticmethod
-    def quick_stats_request(request_symbol_list, field_list):
+    def quick_stats_request(self, request_symbol_list, quick_stats_dict):
         """
-        Returns quick stats for up to 1000 tickers in one request. Only returns those tickers that are valid, thus can
-        be used to validate tickers efficiently.
+        Returns quick stats for up to 1000 tickers in one request: one list per ticker, containing the symbol followed
+        by the requested stats. Only returns those tickers that are valid, thus can be used to validate tickers
+        efficiently.
         """
+        # unformatted values are plain numbers rather than {'raw': ..., 'fmt': ...} dictionaries: smaller responses
         params = {
-            'formatted': 'True',
+            'formatted': 'false',
             'symbols': ','.join(request_symbol_list),
-            'fields': ','.join(field_list),
+            'fields': ','.join(quick_stats_dict.keys()),
         }
-        result = requests.get("https://query1.finance.yahoo.com/v7/finance/quote", params=params)
-        if result.status_code != 200 and result.status_code != 404:
-            result.raise_for_status()
+        url = "https://query1.finance.yahoo.com/v7/finance/quote"
+        json_dict = self.get(url, params)
+        if json_dict is None:
+            return None
 
-        json_dict = result.json()
+        # keep only the requested fields
         if "quoteResponse" not in json_dict:
             return None
         data_list = json_dict['quoteResponse']['result']
 
-        return data_list
+        return [[data['symbol']] + FastYahoo.retrieve_stats(data, quick_stats_dict) for data in data_list]
 
 
 # https://query2.finance.yahoo.com/v10/finance/quoteSummary/aapl?modules=summaryDetail -- for payoutRatio
@@ -4,54 +4,148 @@ import pandas as pd
 
 class Financials:
 
-    def __init__(self, threads=True):
-        self.fast_yahoo = FastYahoo(threads)
-
-    def get_financial_stats(self, results_df, advanced=False):
+    # advanced stats: yahoo stat name -> (yahoo module the stat belongs to, output column name)
+    advanced_stats = {
+        # summary profile information
+        'industry': ('summaryProfile', 'Industry'),
+        # key stats summary
+        'shortPercentOfFloat': ('defaultKeyStatistics', 'Short/Float%'),
+        # summary information
+        'previousClose': ('summaryDetail', 'prvCls'),
+        'open': ('summaryDetail', 'open'),
+        'dayLow': ('summaryDetail', 'daylow'),
+        'dayHigh': ('summaryDetail', 'dayhigh'),
+        'payoutRatio': ('summaryDetail', 'pytRatio'),
+        'forwardPE': ('summaryDetail', 'forwardPE'),
+        'beta': ('summaryDetail', 'beta'),
+        'bidSize': ('summaryDetail', 'bidSize'),
+        'askSize': ('summaryDetail', 'askSize'),
+        'volume': ('summaryDetail', 'volume'),
+        'averageVolume': ('summaryDetail', '3mAvgVol'),
+        'averageVolume10days': ('summaryDetail', 'avgvlmn10'),
+        'fiftyDayAverage': ('summaryDetail', '50dayavg'),
+        'twoHundredDayAverage': ('summaryDetail', '200dayavg'),
+        # financial information
+        'currentPrice': ('financialData', 'CrntPrice'),
+        'quickRatio': ('financialData', 'QckRatio'),
+        'currentRatio': ('financialData', 'CrntRatio'),
+        'targetMeanPrice': ('financialData', 'Trgtmean'),
+        'recommendationKey': ('financialData', 'Recommend'),
+    }
+
+    # advanced stats retrieved when not in advanced mode
+    basic_stats = ['industry', 'shortPercentOfFloat']
+
+    # columns always output, from the (batched) quick stats
+    quick_stats_columns = ['Price', '1DayChange%', '50DayChange%', 'ChangeVol%', 'Float Shares']
+
+    def __init__(self, threads=True, executor=None, rate_limiter=None, proxies=None):
+        self.fast_yahoo = FastYahoo(threads, executor, rate_limiter, proxies=proxies)
+
+    def close(self):
+        self.fast_yahoo.close()
+
+    def get_financial_stats(self, results_df, advanced=False, max_price=None, top=None, sort_column=None,
+                            columns=None, on_update=None):
         """
         results_df: a dataframe whose indices are tickers
         returns a dataframe whose indices are the valid tickers (as per yahoo) from results_df; with new columns
         for the requested ticker information (eg industry, price, etc)
-        """
-
-        # TODO: should be able to build the smarts so that a single dictionary necessary, and download_advanced_stats
-        # function should be able to figure out which yahoo module the stat belongs to
 
-        # dictionary of ticker summary profile information to get from yahoo
-        summary_profile_measures = {'industry': 'Industry'}
+        columns: stat columns to output (quick_stats_columns or advanced_stats); only those are output after the
+        columns of results_df, only the yahoo modules they belong to are requested, and no per-ticker request is made
+        at all if none are. Overrides advanced if provided.
 
-        # dictionary of ticker financial information to get from yahoo
-        financial_measures = {'currentPrice': 'Price', 'quickRatio': 'QckRatio', 'currentRatio': 'CrntRatio',
-                              'targetMeanPrice': 'Trgtmean', 'recommendationKey': 'Recommend'}
+        Cheap predicates are applied before the (one request per ticker) advanced stats are downloaded, so that those
+        are only requested for the tickers which are kept:
+        max_price: drop the tickers whose price (from the batched quick stats) is above max_price
+        top: only keep the top tickers by descending order of sort_column (a column of results_df, by default the first)
 
-        # dictionary of ticker summary information to get from yahoo
-        summary_measures = {'previousClose': 'prvCls', 'open': 'open', 'dayLow': 'daylow', 'dayHigh': 'dayhigh',
-                            'payoutRatio': 'pytRatio', 'forwardPE': 'forwardPE', 'beta': 'beta', 'bidSize': 'bidSize',
-                            'askSize': 'askSize', 'volume': 'volume', 'averageVolume': '3mAvgVol',
-                            'averageVolume10days': 'avgvlmn10', 'fiftyDayAverage': '50dayavg',
-                            'twoHundredDayAverage': '200dayavg'}
-
-        # dictionary of ticker key stats summary
-        key_stats_measures = {'shortPercentOfFloat': 'Short/Float%'}
+        on_update: optional callback, called with the partial dataframe as stats arrive: once the quick stats are
+        retrieved, then as the advanced stats are (whose missing cells are left empty). Advanced stats are then
+        requested by descending order of sort_column, so that the top tickers are complete first.
+        """
 
-        # mapping of yahoo module names to dictionaries containing data we want to retrieve
-        module_name_map = {'summaryProfile': summary_profile_measures, 'defaultKeyStatistics': key_stats_measures}
+        module_name_map = self.get_module_name_map(columns, advanced)
+        if sort_column is None:
+            sort_column = results_df.columns[0]
 
-        if advanced:
-            module_name_map.update({'summaryDetail': summary_measures, 'financialData': financial_measures})
+        output_columns = None
+        if columns is not None:
+            output_columns = list(results_df.columns) + list(dict.fromkeys(columns))
 
         # check for valid symbols and get quick stats
         ticker_list = list(results_df.index.values)
         quick_stats_df = self.get_quick_stats(ticker_list)
+
+        # price predicate; tickers without a price are kept
+        if max_price is not None:
+            price = pd.to_numeric(quick_stats_df['Price'], errors='coerce')
+            quick_stats_df = quick_stats_df[~(price > max_price)]
+
+        # top-k limit on the sort column, among the remaining valid tickers
+        if top is not None:
+            results_df_valid = results_df.loc[quick_stats_df.index]
+            top_ticker_list = results_df_valid.nlargest(top, sort_column).index
+            quick_stats_df = quick_stats_df.loc[top_ticker_list]
+
         valid_ticker_list = list(quick_stats_df.index.values)
 
-        # get advanced stats
-        summary_stats_df = self.fast_yahoo.download_advanced_stats(valid_ticker_list, module_name_map)
+        # get advanced stats, only for the tickers that survived the predicates
         results_df_valid = results_df.loc[valid_ticker_list]
-        df = pd.concat([results_df_valid, quick_stats_df, summary_stats_df], axis=1)
-        df.index.name = results_df.index.name
-
-        return df
+        df_list = [results_df_valid, quick_stats_df]
+
+        def concat(concat_df_list):
+            concat_df = pd.concat(concat_df_list, axis=1)
+            concat_df.index.name = results_df.index.name
+            if output_columns is not None:
+                concat_df = concat_df.reindex(columns=output_columns, fill_value='')
+            return concat_df
+
+        def update(advanced_df=None):
+            partial_df_list = df_list
+            if advanced_df is not None:
+                partial_df_list = df_list + [advanced_df.reindex(valid_ticker_list, fill_value='')]
+            on_update(concat(partial_df_list))
+
+        advanced_update = None
+        if on_update is not None:
+            update()
+            advanced_update = update
+            valid_ticker_list = list(results_df_valid.sort_values(sort_column, ascending=False).index)
+
+        if module_name_map:
+            df_list.append(self.fast_yahoo.download_advanced_stats(valid_ticker_list, module_name_map,
+                                                                   advanced_update))
+
+        return concat(df_list)
+
+    @classmethod
+    def get_module_name_map(cls, columns=None, advanced=False):
+        """
+        Returns the mapping of yahoo module names to dictionaries of the stats to retrieve from them (yahoo stat name ->
+        output column name), for the requested output columns. Columns output by the quick stats need no module. If
+        columns is not provided: all the advanced stats if advanced, the basic stats otherwise.
+        """
+        if columns is None:
+            stat_list = list(cls.advanced_stats) if advanced else cls.basic_stats
+        else:
+            column_stat_map = {name: stat for stat, (module, name) in cls.advanced_stats.items()}
+            stat_list = []
+            for column in columns:
+                if column in cls.quick_stats_columns:
+                    continue
+                if column not in column_stat_map:
+                    choices_str = ', '.join(dict.fromkeys(cls.quick_stats_columns + list(column_stat_map)))
+                    raise ValueError("Invalid column '{}'. Valid choices:\n{}".format(column, choices_str))
+                stat_list.append(column_stat_map[column])
+
+        module_name_map = {}
+        for stat in stat_list:
+            module, name = cls.advanced_stats[stat]
+            module_name_map.setdefault(module, {})[stat] = name
+
+        return module_name_map
 
     def get_quick_stats(self, ticker_list):
 
@@ -60,7 +154,7 @@ class Financials:
                        'regularMarketPrice': 'price', 'regularMarketChangePercent': '1DayChange%',
                        'floatShares': 'float'}
 
-        unprocessed_df = self.fast_yahoo.download_quick_stats(ticker_list, quick_stats)
+        unprocessed_df, failed_symbols = self.fast_yahoo.download_quick_stats(ticker_list, quick_stats)
 
         processed_stats_table = []
         # TODO: if looping over rows becomes slow: vectorize. (Tested with 270 symbols and practically instantaneous)
@@ -75,6 +169,11 @@ class Financials:
             day_change = row['1DayChange%']
             stock_float = row['float']
 
+            if symbol in failed_symbols:
+                # the stats could not be retrieved (the ticker could not be validated): kept, with its stats N/A
+                processed_stats_table.append([symbol] + ['N/A'] * len(self.quick_stats_columns))
+                continue
+
             valid = False
             if price != "N/A" and price != 0:
                 valid = True
@@ -118,7 +217,7 @@ class Financials:
                 processed_stats_table.append(stat_list)
 
         # construct dataframe
-        columns = ['Symbol', 'Price', '1DayChange%', '50DayChange%', 'ChangeVol%', 'Float Shares']
+        columns = ['Symbol'] + self.quick_stats_columns
         stats_df = pd.DataFrame(processed_stats_table, columns=columns)
         stats_df.set_index('Symbol', inplace=True)
 
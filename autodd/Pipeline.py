@@ -0,0 +1,225 @@
+from warnings import warn
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from .Proxies import Proxies
+from .Financials import Financials
+from .Submissions import SubmissionsPsaw, SubmissionsPraw, SubmissionsHybrid
+from .Comments import Comments
+from .ScoreMatrix import TickerIndex
+from .TickerCache import TickerCache
+from .scores import get_ticker_scores, gen_delta_scores, filter_df
+
+
+class Pipeline:
+    """
+    In-process AutoDD pipeline. Owns one set of thread pools and http clients which are reused by every call to run(),
+    so that the pipeline can be embedded in a long-lived service. Call close() (or use as a context manager) to release
+    them.
+    """
+
+    def __init__(self, db='hybrid', proxies=None, praw_cred_file=None, threads=True, cache_file=None):
+        if db not in ('psaw', 'praw', 'hybrid'):
+            raise ValueError("Invalid db '{}'. Valid choices:\npsaw, praw, hybrid".format(db))
+
+        self.db = db
+        self.proxies = proxies if proxies is not None else Proxies()
+        self.praw_cred_file = praw_cred_file
+
+        # reddit retrieval runs one thread per proxy; yahoo retrieval is only threaded if requested, and then scales
+        # with the number of proxies it is spread over
+        self.submissions_executor = ThreadPoolExecutor(max_workers=len(self.proxies.proxy_list))
+        self.yahoo_executor = None
+        if threads:
+            self.yahoo_executor = ThreadPoolExecutor(max_workers=cpu_count()*2*len(self.proxies.proxy_list))
+
+        # yahoo requests go through the same proxies, and share their request budget
+        self.financials = Financials(threads=threads, executor=self.yahoo_executor, proxies=self.proxies)
+
+        # submission apis are created lazily, one per requested subreddit selection, and kept for subsequent runs
+        self._submissions_apis = {}
+
+        # tickers extracted from already seen submission texts, kept for subsequent runs (and saved to cache_file)
+        self.ticker_cache = TickerCache(cache_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shuts down the thread pools and http clients owned by the pipeline, and saves the ticker cache.
+        """
+        self.ticker_cache.save()
+        for submissions_api in self._submissions_apis.values():
+            submissions_api.close()
+        self._submissions_apis = {}
+        self.financials.close()
+        self.submissions_executor.shutdown(wait=True)
+        if self.yahoo_executor is not None:
+            self.yahoo_executor.shutdown(wait=True)
+
+    def get_submissions_api(self, sub):
+        """
+        Returns the submissions api for the requested subreddit ('' for all subreddits), creating it on first use.
+        """
+        if sub not in self._submissions_apis:
+            if self.db == 'psaw':
+                submissions_api = SubmissionsPsaw(sub=sub, proxies=self.proxies, executor=self.submissions_executor)
+            elif self.db == 'praw':
+                submissions_api = SubmissionsPraw(sub=sub, credentials_file=self.praw_cred_file, proxies=self.proxies,
+                                                  executor=self.submissions_executor)
+            else:
+                submissions_api = SubmissionsHybrid(sub=sub, credentials_file=self.praw_cred_file,
+                                                    proxies=self.proxies, executor=self.submissions_executor)
+            self._submissions_apis[sub] = submissions_api
+
+        return self._submissions_apis[sub]
+
+    @staticmethod
+    def get_timestamps(n):
+        """
+        Returns the timestamps of 2n hours ago, n hours ago and now
+        """
+        mid_interval = datetime.today() - timedelta(hours=n)
+        ts_mid = int(mid_interval.timestamp())
+        ts_start = int((mid_interval - timedelta(hours=n)).timestamp())
+        ts_end = int(datetime.today().timestamp())
+        return ts_start, ts_mid, ts_end
+
+    def get_comments(self, n, sub):
+        """
+        Returns two dictionaries, like get_submissions, but whose values are generators of comments (containing body and
+        score) which fetch the comments as they are traversed
+        """
+        comments_api = Comments(self.get_submissions_api(sub))
+
+        ts_start, ts_mid, ts_end = self.get_timestamps(n)
+
+        search_filter = ['body', 'score']
+        recent = comments_api.get_comments(start=ts_mid, end=ts_end, search_filter=search_filter)
+        prev = comments_api.get_comments(start=ts_start, end=ts_mid, search_filter=search_filter)
+
+        return recent, prev
+
+    def get_submissions(self, n, sub, text_fields=('title', 'selftext')):
+        """
+        Returns two dictionaries:
+        1st dictionary: current result from n hours ago until now
+        2nd dictionary: prev result from 2n hours ago until n hours ago
+        The two dictionaries' keys are the requested subreddit: all subreddits if sub is empty, and just "sub" otherwise
+        The value paired with each subreddit key is a list of submissions, containing text_fields and score
+        """
+        submissions_api = self.get_submissions_api(sub)
+
+        ts_start, ts_mid, ts_end = self.get_timestamps(n)
+
+        # only download the fields which are scored
+        search_filter = list(text_fields) + ['score']
+        sanity = ['wallstreetbets', 'wallstreetbetsELITE', 'SatoshiStreetBets']
+        recent = submissions_api.get_submissions(start=ts_mid, end=ts_end, search_filter=search_filter,
+                                                 sanity_list=sanity)
+        prev = submissions_api.get_submissions(start=ts_start, end=ts_mid, search_filter=search_filter,
+                                               sanity_list=sanity)
+
+        if all(value == [] for value in prev.values()):
+            raise Exception('No results for the previous time period.')
+        elif not recent:
+            raise Exception('No results for the recent time period.')
+
+        for subreddit in prev:
+            if not prev[subreddit]:
+                warn('No results for the previous time period in {} subreddit.'.format(subreddit))
+            if not recent[subreddit]:
+                warn('No results for the recent time period in {} subreddit.'.format(subreddit))
+
+        return recent, prev
+
+    def get_scores(self, interval, sub, min_score, text_fields=('title', 'selftext'), comments=False):
+        """
+        Returns the filtered score dataframe: total, prev, recent and change in score, rocket count, and (if more than
+        one subreddit scored) the total score in each subreddit. If comments is True, the comments' scores are added to
+        the submissions' scores.
+        """
+        recent, prev = self.get_submissions(interval, sub, text_fields)
+
+        # both intervals share one ticker index, so that their score matrices are aligned
+        ticker_index = TickerIndex()
+        cache = self.ticker_cache
+        current_scores, current_rockets = get_ticker_scores(recent, ['🚀'], ticker_index, cache, text_fields)
+        prev_scores, prev_rockets = get_ticker_scores(prev, ['🚀'], ticker_index, cache, text_fields)
+
+        if comments:
+            # comments are streamed straight into the scorer; their counts go to the same columns as the submissions'.
+            # They are not cached: they would fill the cache (and its file), evicting the submissions
+            recent_comments, prev_comments = self.get_comments(interval, sub)
+            scores, rockets = get_ticker_scores(recent_comments, ['🚀'], ticker_index, None, ('body',))
+            current_scores, current_rockets = current_scores.merge(scores), current_rockets.merge(rockets)
+            scores, rockets = get_ticker_scores(prev_comments, ['🚀'], ticker_index, None, ('body',))
+            prev_scores, prev_rockets = prev_scores.merge(scores), prev_rockets.merge(rockets)
+
+        # count rockets
+        rockets = current_rockets.merge(prev_rockets)
+        rockets.rename({'🚀': 'Rockets'})
+
+        # populate score matrix
+        score_matrices = [rockets]
+        if len(current_scores.columns) > 1:
+            score_matrices.append(current_scores.merge(prev_scores))
+        results = gen_delta_scores(current_scores, prev_scores, interval).concat(*score_matrices)
+
+        # only the tickers above the min score are converted to a dataframe
+        results_df = results.to_frame(results.select(results.columns[0], min_score))
+        results_df = filter_df(results_df, min_score)
+
+        return results_df
+
+    def run(self, interval=24, sub='', min_score=200, advanced=False, sort=1, max_price=None, top=None, columns=None,
+            text_fields=('title', 'selftext'), comments=False, on_update=None):
+        """
+        Runs the full pipeline and returns the dd table as a dataframe whose indices are the tickers.
+
+        interval: time interval in hours; scores are computed for the last interval and the interval before it
+        sub: subreddit to scrape; all subreddits if empty
+        min_score: minimum total score for a ticker to be kept
+        advanced: also retrieve advanced yahoo stats
+        sort: sort by descending order of 1: total score, 2: prev score, 3: recent score, 4: change in score, 5: rockets
+        max_price: drop the tickers whose price is above max_price
+        top: only keep the top tickers as per the sort column
+        columns: financial columns to output (see Financials.quick_stats_columns and advanced_stats); overrides advanced
+        if provided
+        text_fields: submission fields searched for tickers; ('title',) avoids downloading selftext, the largest field
+        comments: also score the comments (psaw and hybrid db only)
+        on_update: optional callback, called with the partial (sorted) dd table as soon as the scores are computed, then
+        as financial stats arrive (the top tickers' stats are retrieved first), and lastly with the complete dd table
+
+        Filters are applied as early as possible: min_score before any yahoo request, max_price and top after the
+        batched quick stats but before the per-ticker advanced stats.
+        """
+        # fail on invalid arguments before any request is made
+        Financials.get_module_name_map(columns, advanced)
+        if comments and self.db == 'praw':
+            raise ValueError("Comments require a pushshift-backed submissions api (psaw or hybrid).")
+
+        results_df = self.get_scores(interval, sub, min_score, text_fields, comments)
+
+        # the sort column is a score column, thus known before any financial stats are retrieved
+        sort_column = results_df.columns[sort - 1]
+
+        financials_update = None
+        if on_update is not None:
+            def financials_update(partial_df):
+                on_update(partial_df.sort_values(by=sort_column, ascending=False))
+
+            financials_update(results_df)
+
+        results_df = self.financials.get_financial_stats(results_df, advanced, max_price, top, sort_column, columns,
+                                                         financials_update)
+
+        results_df.sort_values(by=sort_column, inplace=True, ascending=False)
+        if on_update is not None:
+            on_update(results_df)
+
+        return results_df
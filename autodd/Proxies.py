@@ -1,11 +1,15 @@
 from os.path import isfile
 from proxy_checker import ProxyChecker
 from concurrent.futures import ThreadPoolExecutor
+from .RateLimiter import RateLimiter
 
 class Proxies:
     def __init__(self, proxy_filename=None):
         self.proxy_list = self.get_proxies(proxy_filename)
 
+        # request budget per host and per proxy, shared by everything that fetches through these proxies
+        self.rate_limiter = RateLimiter()
+
     @staticmethod
     def get_proxies(proxy_filename):
         if proxy_filename:
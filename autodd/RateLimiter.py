@@ -0,0 +1,145 @@
+from threading import Lock, BoundedSemaphore
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+class TokenBucket:
+    """
+    Request budget for one host through one proxy: at most max_concurrency requests in flight, started at no more than
+    rate requests per second on average (with bursts of up to burst requests).
+
+    The rate is halved whenever the server throttles (429, or a Retry-After header), and requests are held back for as
+    long as Retry-After asks; each successful response then raises it by max_rate / 20, up to max_rate.
+    """
+
+    def __init__(self, rate, burst=None, max_concurrency=8, min_rate=0.1):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.blocked_until = 0
+        self._last = monotonic()
+        self._lock = Lock()
+        self._semaphore = BoundedSemaphore(max_concurrency)
+
+    def acquire(self):
+        """
+        Blocks until a request may be started
+        """
+        self._semaphore.acquire()
+        while True:
+            with self._lock:
+                now = monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+                self._last = now
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def release(self):
+        self._semaphore.release()
+
+    def set_rate(self, rate):
+        """
+        Sets the allowed rate, eg as advertised by the server
+        """
+        with self._lock:
+            self.max_rate = self.rate = rate
+            self.min_rate = min(self.min_rate, rate)
+
+    def update(self, status_code, retry_after=None):
+        """
+        Adapts the rate to the response of a request
+        """
+        with self._lock:
+            if status_code == 429 or retry_after is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, monotonic() + retry_after)
+            elif status_code < 400:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter:
+    """
+    Shared registry of token buckets, one per (host, proxy) pair since servers limit requests per client IP. Every
+    fetcher (yahoo, pushshift and reddit) goes through the same limiter, so that they share one notion of the budget.
+    """
+
+    # requests per second allowed by default for each host; other hosts get default_rate
+    host_rates = {
+        'query1.finance.yahoo.com': 10,
+        'query2.finance.yahoo.com': 10,
+        'api.pushshift.io': 2,
+        'oauth.reddit.com': 1,
+        'www.reddit.com': 1,
+    }
+
+    def __init__(self, host_rates=None, default_rate=10, max_concurrency=8):
+        self.host_rates = dict(self.host_rates)
+        if host_rates:
+            self.host_rates.update(host_rates)
+        self.default_rate = default_rate
+        self.max_concurrency = max_concurrency
+        self._buckets = {}
+        self._lock = Lock()
+
+    def bucket(self, url, proxy=''):
+        """
+        Returns the token bucket of the host of url (or of url itself if it is a host name) through proxy
+        """
+        host = urlsplit(url).hostname or url
+        key = (host, proxy or '')
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    rate = self.host_rates.get(host, self.default_rate)
+                    bucket = self._buckets[key] = TokenBucket(rate, max_concurrency=self.max_concurrency)
+        return bucket
+
+    def set_rate(self, url, rate, proxy=''):
+        """
+        Sets the allowed rate (in requests per second) of the host of url through proxy, eg as advertised by the server
+        """
+        self.bucket(url, proxy).set_rate(rate)
+
+    def call(self, url, proxy, request, *args, **kwargs):
+        """
+        Performs request(*args, **kwargs), an http request to url returning a response, within the budget of url's host
+        through proxy, then adapts that budget to the response.
+        """
+        bucket = self.bucket(url, proxy)
+        bucket.acquire()
+        try:
+            response = request(*args, **kwargs)
+        finally:
+            bucket.release()
+        bucket.update(response.status_code, self.retry_after(response))
+        return response
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Returns the number of seconds requested by the Retry-After header of a response, or None if there is none
+        """
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,53 @@
+class Record:
+    """
+    Compact submission (or comment) record: only the requested fields plus created_utc, held in slots rather than in a
+    per-post dictionary. Fields are read as attributes (eg record.created_utc); fields the api did not return are left
+    unset, so that record.get(field, default) behaves like dict.get.
+
+    Use record_type(fields) to get the record class of a given set of fields.
+    """
+
+    __slots__ = ()
+    fields = ()
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.fields if hasattr(self, field)}
+
+    def __repr__(self):
+        fields_str = ', '.join('{}={!r}'.format(field, value) for field, value in self.to_dict().items())
+        return '{}({})'.format(type(self).__name__, fields_str)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """
+        Builds a record from a dictionary, eg the one returned by pushshift
+        """
+        record = cls.__new__(cls)
+        for field in cls.fields:
+            if field in mapping:
+                setattr(record, field, mapping[field])
+        return record
+
+    @classmethod
+    def from_object(cls, obj):
+        """
+        Builds a record from the attributes of an object, eg a praw submission
+        """
+        return cls.from_mapping(vars(obj))
+
+
+_record_types = {}
+
+
+def record_type(fields):
+    """
+    Returns the Record subclass holding the given fields plus created_utc (one class per set of fields)
+    """
+    fields = tuple(dict.fromkeys(list(fields) + ['created_utc']))
+    cls = _record_types.get(fields)
+    if cls is None:
+        cls = _record_types[fields] = type('Record', (Record,), {'__slots__': fields, 'fields': fields})
+    return cls
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from array import array
+
+
+class TickerIndex:
+    """
+    Interns ticker strings as consecutive integer ids. Score matrices sharing one index are aligned by construction:
+    row i of each of them is the ticker with id i.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.tickers = []
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def intern(self, ticker):
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            ticker_id = self.ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+        return ticker_id
+
+
+class ScoreMatrix:
+    """
+    Ticker x column matrix of integer counts (eg scores per subreddit, or pattern counts). Each column is an array
+    indexed by ticker id which only grows as far as the largest id it has seen, and rows are only part of the matrix
+    once a ticker has been added to it. Matrices sharing a TickerIndex combine without any reindexing; conversion to a
+    dataframe only happens once, for the rows that are actually output.
+    """
+
+    def __init__(self, columns=(), ticker_index=None):
+        self.ticker_index = ticker_index if ticker_index is not None else TickerIndex()
+        self.columns = list(columns)
+        self._data = {column: array('q') for column in self.columns}
+        self._present = bytearray()
+
+    def __len__(self):
+        """
+        Number of tickers in the matrix
+        """
+        return self._present.count(1)
+
+    def reserve(self, size):
+        """
+        Grows every column (zero-filled) to hold at least size tickers, so that column(name)[ticker_id] can be
+        updated directly for all ids below size.
+        """
+        for data in self._data.values():
+            if len(data) < size:
+                data.frombytes(bytes(data.itemsize * (size - len(data))))
+        if len(self._present) < size:
+            self._present.extend(bytes(size - len(self._present)))
+
+    def column(self, name):
+        """
+        Returns the raw array of a column, indexed by ticker id
+        """
+        return self._data[name]
+
+    def mark(self, ticker_id):
+        """
+        Makes a ticker part of the matrix, even if all its counts are zero
+        """
+        self._present[ticker_id] = 1
+
+    def ids(self):
+        """
+        Returns the ids of the tickers in the matrix
+        """
+        return np.flatnonzero(self.presence())
+
+    def presence(self):
+        """
+        Returns a boolean numpy array covering the whole ticker index, true for the tickers in the matrix
+        """
+        presence = np.zeros(len(self.ticker_index), dtype=bool)
+        presence[:len(self._present)] = np.frombuffer(self._present, dtype=np.uint8).astype(bool)
+        return presence
+
+    def values(self, column):
+        """
+        Returns a column as a numpy array covering the whole ticker index (zero for tickers not in the matrix)
+        """
+        data = self._data[column]
+        values = np.zeros(len(self.ticker_index), dtype=np.int64)
+        values[:len(data)] = np.frombuffer(data, dtype=np.int64)
+        return values
+
+    def row_sums(self):
+        """
+        Returns the sum over all columns of each ticker, covering the whole ticker index
+        """
+        sums = np.zeros(len(self.ticker_index), dtype=np.int64)
+        for column in self.columns:
+            sums += self.values(column)
+        return sums
+
+    def merge(self, other):
+        """
+        Returns a new matrix whose counts are the sum of both matrices; columns are the union of both matrices' columns
+        """
+        self._check_index(other)
+        columns = self.columns + [column for column in other.columns if column not in self._data]
+        values_dict = {}
+        for column in columns:
+            values = np.zeros(len(self.ticker_index), dtype=np.int64)
+            for matrix in (self, other):
+                if column in matrix._data:
+                    values += matrix.values(column)
+            values_dict[column] = values
+        return ScoreMatrix.from_values(self.ticker_index, values_dict, self.presence() | other.presence())
+
+    def concat(self, *others):
+        """
+        Returns a new matrix containing the columns of this matrix followed by those of the other matrices
+        """
+        values_dict = {column: self.values(column) for column in self.columns}
+        presence = self.presence()
+        for other in others:
+            self._check_index(other)
+            for column in other.columns:
+                if column in values_dict:
+                    raise ValueError("Duplicate column '{}'".format(column))
+                values_dict[column] = other.values(column)
+            presence = presence | other.presence()
+        return ScoreMatrix.from_values(self.ticker_index, values_dict, presence)
+
+    def rename(self, column_map):
+        """
+        Renames columns in place
+        """
+        self.columns = [column_map.get(column, column) for column in self.columns]
+        self._data = {column_map.get(column, column): data for column, data in self._data.items()}
+
+    def select(self, column, min_val):
+        """
+        Returns the ids of the tickers in the matrix whose value in column is at least min_val
+        """
+        return np.flatnonzero(self.presence() & (self.values(column) >= min_val))
+
+    def to_frame(self, ids=None, dtype='int32', index_name='Ticker'):
+        """
+        Converts the rows with the given ticker ids (all tickers in the matrix by default) to a dataframe
+        """
+        if ids is None:
+            ids = self.ids()
+        ids = np.asarray(ids, dtype=np.int64)
+        tickers = self.ticker_index.tickers
+        index = pd.Index([tickers[ticker_id] for ticker_id in ids], name=index_name)
+        data = {column: self.values(column)[ids].astype(dtype) for column in self.columns}
+        return pd.DataFrame(data, index=index, columns=self.columns)
+
+    @classmethod
+    def from_values(cls, ticker_index, values_dict, presence=None):
+        """
+        Builds a matrix from numpy arrays covering the whole ticker index, one per column
+        """
+        matrix = cls(values_dict.keys(), ticker_index)
+        for column, values in values_dict.items():
+            matrix._data[column].frombytes(np.asarray(values, dtype=np.int64).tobytes())
+        if presence is None:
+            presence = np.ones(len(ticker_index), dtype=bool)
+        matrix._present = bytearray(np.asarray(presence, dtype=np.uint8).tobytes())
+        return matrix
+
+    def _check_index(self, other):
+        if other.ticker_index is not self.ticker_index:
+            raise ValueError("Score matrices must share the same ticker index.")
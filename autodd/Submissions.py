@@ -2,19 +2,37 @@ import json
 from .utils import suppress_warnings  # don't remove: suppresses bad warnings from PushShiftAPI
 from .utils import gen_slices, localtime
 from warnings import warn
-from psaw import PushshiftAPI
+from .FastPushshift import FastPushshiftAPI
 from praw import Reddit
+from prawcore import Requestor
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from abc import ABC, abstractmethod
 from os.path import isfile
+from operator import attrgetter
+from .Record import record_type
+
+
+class RateLimitedRequestor(Requestor):
+    """
+    praw requestor whose requests go through a RateLimiter shared with the other fetchers
+    """
+
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def request(self, *args, **kwargs):
+        # args are (method, url)
+        return self.rate_limiter.call(args[1], '', super().request, *args, **kwargs)
 
 
 class Submissions(ABC):
 
     @abstractmethod
-    def __init__(self, sub, proxies, valid_subreddit_dict=None):
+    def __init__(self, sub, proxies, valid_subreddit_dict=None, executor=None):
         self.proxy_list = proxies.proxy_list
+        self.rate_limiter = proxies.rate_limiter
 
         if not valid_subreddit_dict:
             valid_subreddit_dict = {'wallstreetbets': 'WSB',
@@ -37,9 +55,31 @@ class Submissions(ABC):
         else:
             self.subreddit_dict = valid_subreddit_dict
 
-        self.executor = ThreadPoolExecutor(max_workers=len(self.proxy_list))
+        # an executor shared by the caller is used as is and not shut down by close()
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=len(self.proxy_list))
+        self.executor = executor
         self._map = self.executor.map
 
+        # indices of the proxies (and their apis) which have not failed a pushshift search since the last reset
+        self.healthy_api_indices = set(range(len(self.proxy_list)))
+
+    def reset_proxy_health(self):
+        """
+        Makes all proxies healthy again, eg at the start of each search, so that a transient failure only excludes a
+        proxy for the rest of the search in which it occurred.
+        """
+        self.healthy_api_indices = set(range(len(self.proxy_list)))
+
+    def close(self):
+        """
+        Shuts down the executor if owned by this instance.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+            self._owns_executor = False
+
     @abstractmethod
     def get_subreddit_submissions(self, start, end, subreddit, search_filter, sanity=False):
         pass
@@ -56,32 +96,135 @@ class Submissions(ABC):
 
     @staticmethod
     def check_data_gaps(subreddit, start, end, results, sanity=False):
-        if sanity:
-            s, e = localtime(start), localtime(end)
-            end_gap = (end - results[0]['created_utc']) / 60
-            start_gap = (results[-1]['created_utc'] - start) / 60
-            if end_gap > 20:
-                warn("{}: No data for last {:.1f} minutes. Interval: {} to {}.".format(subreddit, end_gap, s, e))
-            if start_gap > 20:
-                warn("{}: No data for first {:.1f} minutes. Interval: {} to {}.".format(subreddit, start_gap, s, e))
+        """
+        Returns a list of (after, before) intervals in which data appears to be missing: no data for more than 20
+        minutes at the start or end of the interval, or more than 30 minutes between two consecutive submissions.
+        Results are expected in descending order of creation time. Done in a single pass over the results.
+        """
+        gaps = []
+        if not sanity:
+            return gaps
+
+        s, e = localtime(start), localtime(end)
+        if not results:
+            warn("{}: No data at all. Interval: {} to {}.".format(subreddit, s, e))
+            return [(start, end)]
+
+        newest, oldest = results[0].created_utc, results[-1].created_utc
+        end_gap = (end - newest) / 60
+        start_gap = (oldest - start) / 60
+        if end_gap > 20:
+            warn("{}: No data for last {:.1f} minutes. Interval: {} to {}.".format(subreddit, end_gap, s, e))
+            gaps.append((newest, end))
+
+        previous = newest
+        for result in results:
+            created_utc = result.created_utc
+            m = (previous - created_utc) / 60
+            if m > 30:
+                # local time for start of gap and end of gap
+                sg, eg = localtime(previous), localtime(created_utc)
+                warn("{}: {:.1f} minute gap between {} and {}. Interval: {} to {}.".format(subreddit, m, sg, eg, s, e))
+                gaps.append((created_utc, previous))
+            previous = created_utc
 
-            # timestamp of all created_utc + start and end of time interval
-            timestamps = [end] + [result['created_utc'] for result in results] + [start]
-            ts_diff = [(timestamps[i] - timestamps[i + 1]) / 60 for i in range(len(timestamps) - 1)]
+        if start_gap > 20:
+            warn("{}: No data for first {:.1f} minutes. Interval: {} to {}.".format(subreddit, start_gap, s, e))
+            gaps.append((start, oldest))
 
-            # index and value of max time gap
-            i, m = max(enumerate(ts_diff), key=lambda x: x[1])
+        return gaps
 
-            # local time for start of gap and end of gap
-            sg, eg = localtime(timestamps[i]), localtime(timestamps[i + 1])
+    @staticmethod
+    def to_records(submissions, search_filter):
+        """
+        Converts the submission objects returned by the api to records holding the search_filter fields
+        """
+        record = record_type(search_filter)
+        return [record.from_object(submission) for submission in submissions]
 
-            if m > 30:
-                warn("{}: {:.1f} minute gap between {} and {}. Interval: {} to {}.".format(subreddit, m, sg, eg, s, e))
+    def search_slice(self, api_index, arg_dict):
+        """
+        Traverses one time slice of a pushshift search using the api (ie proxy) at api_index, converting submissions
+        to records as they are retrieved. If the search fails, returns None and marks the proxy as unhealthy so that
+        it is not used for subsequent searches.
+        """
+        try:
+            return self.to_records(self.api_list[api_index].search_submissions(**arg_dict), arg_dict['filter'])
+        except Exception as exception:
+            s, e = localtime(arg_dict['after']), localtime(arg_dict['before'])
+            warn("{}: search from {} to {} failed on proxy {}: {}".format(arg_dict['subreddit'], s, e, api_index,
+                                                                          exception))
+            self.healthy_api_indices.discard(api_index)
+            return None
+
+    def search_interval(self, start, end, subreddit, search_filter):
+        """
+        Pushshift search between start and end, time-sliced over the healthy proxies, each slice in its own thread.
+        Returns the records of the submissions found (in descending order of creation time) and the list of (after,
+        before) slices which could not be retrieved: the whole interval if no healthy proxy is left.
+        """
+        api_indices = sorted(self.healthy_api_indices)
+        if not api_indices:
+            warn("{}: no healthy proxy left to search pushshift.".format(subreddit))
+            return [], [(start, end)]
+
+        # what search_submission argument would be if multi-threading not performed
+        arg_dict = {'after': start, 'before': end, 'subreddit': subreddit, 'filter': search_filter}
+
+        # generate time-sliced arguments
+        arg_dict_list = gen_slices(len(api_indices), arg_dict)
+
+        # traverse the slices, each in their own thread; flatten to a list
+        submissions, failed_slices = [], []
+        for slice_arg_dict, result in zip(arg_dict_list, self._map(self.search_slice, api_indices, arg_dict_list)):
+            if result is None:
+                failed_slices.append((slice_arg_dict['after'], slice_arg_dict['before']))
+            else:
+                submissions.extend(result)
+
+        return submissions, failed_slices
+
+    def repair_data_gaps(self, subreddit, results, gaps, search_filter):
+        """
+        Refetches only the missing (after, before) intervals, each in parallel over the healthy proxies, and merges the
+        submissions found into results (kept in descending order of creation time).
+        """
+        if not gaps:
+            return results
+
+        # merge overlapping gaps (eg a failed slice also detected as a time gap) so nothing is fetched twice
+        merged_gaps = []
+        for after, before in sorted(gaps):
+            if merged_gaps and after < merged_gaps[-1][1]:
+                merged_gaps[-1][1] = max(merged_gaps[-1][1], before)
+            else:
+                merged_gaps.append([after, before])
+
+        repaired = []
+        for after, before in merged_gaps:
+            if not self.healthy_api_indices:
+                # partial results are returned rather than failing the whole search
+                warn("{}: no healthy proxy left to refetch data from {}.".format(subreddit, localtime(after)))
+                break
+            submissions, failed_slices = self.search_interval(after, before, subreddit, search_filter)
+            if failed_slices:
+                warn("{}: could not refetch data from {} to {}.".format(subreddit, localtime(after), localtime(before)))
+
+            # gap boundaries are existing submissions (or the interval limits): only keep what is strictly inside
+            repaired.extend(result for result in submissions if after < result.created_utc < before)
+
+        if repaired:
+            results = results + repaired
+            results.sort(key=attrgetter('created_utc'), reverse=True)
+
+        return results
 
     def get_submissions(self, start, end, search_filter, sanity_list=[]):
         """
         Returns a list of submissions between start and end, and satisfying criteria in search_filter
         """
+        self.reset_proxy_health()
+
         results = {}
         for subreddit in self.subreddit_dict:
             sanity = False
@@ -94,36 +237,40 @@ class Submissions(ABC):
 
 class SubmissionsPsaw(Submissions):
 
-    def __init__(self, sub, proxies, valid_subreddit_dict=None):
-        super().__init__(sub, proxies, valid_subreddit_dict)
-        self.api_list = [PushshiftAPI(https_proxy=proxy) for proxy in self.proxy_list]
+    def __init__(self, sub, proxies, valid_subreddit_dict=None, executor=None):
+        super().__init__(sub, proxies, valid_subreddit_dict, executor)
+        self.api_list = [FastPushshiftAPI(https_proxy=p, rate_limiter=self.rate_limiter) for p in self.proxy_list]
 
-    def get_subreddit_submissions(self, start, end, subreddit, search_filter, sanity=False):
-        # what search_submission argument would be if multi-threading not performed
-        arg_dict = {'after': start, 'before': end, 'subreddit': subreddit, 'filter': search_filter}
-
-        # generate time-sliced arguments
-        arg_dict_list = gen_slices(len(self.proxy_list), arg_dict)
-
-        # get generators that perform pushshift requests for their respective slices (using their respective proxies)
-        generator_list = [self.api_list[i].search_submissions(**arg_dict_list[i]) for i in range(len(self.proxy_list))]
+    def close(self):
+        super().close()
+        for api in self.api_list:
+            api.close()
 
-        # traverse the generators, each in their own thread; flatten to a list; convert each submission to a dictionary
-        results = [submission.d_ for result in self._map(list, generator_list) for submission in result]
+    def get_subreddit_submissions(self, start, end, subreddit, search_filter, sanity=False):
+        # time-sliced search, each slice in its own thread (using its respective proxy)
+        results, failed_slices = self.search_interval(start, end, subreddit, search_filter)
 
-        # sanity check that data complete
-        self.check_data_gaps(subreddit, start, end, results, sanity=False)
+        # sanity check that data complete; refetch what is missing
+        gaps = failed_slices + self.check_data_gaps(subreddit, start, end, results, sanity)
+        results = self.repair_data_gaps(subreddit, results, gaps, search_filter)
 
         return results
 
+    @staticmethod
+    def to_records(submissions, search_filter):
+        record = record_type(search_filter)
+        return [record.from_mapping(submission.d_) for submission in submissions]
+
 
 class SubmissionsPraw(Submissions):
 
-    def __init__(self, sub, credentials_file, proxies, valid_subreddit_dict=None):
-        super().__init__(sub, proxies, valid_subreddit_dict)
+    def __init__(self, sub, credentials_file, proxies, valid_subreddit_dict=None, executor=None):
+        super().__init__(sub, proxies, valid_subreddit_dict, executor)
 
         client_id, client_secret, user_agent = self.get_praw_credentials(credentials_file)
-        self.api_list = [Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)]
+        self.api_list = [Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent,
+                                requestor_class=RateLimitedRequestor,
+                                requestor_kwargs={'rate_limiter': self.rate_limiter})]
 
     def get_subreddit_submissions(self, start, end, subreddit, search_filter, sanity=False):
         api = self.api_list[0]
@@ -132,54 +279,54 @@ class SubmissionsPraw(Submissions):
         if 'created_utc' not in search_filter:
             search_filter.append('created_utc')
 
-        # praw limitation gets only 1000 posts
+        # praw limitation gets only 1000 posts; each is converted to a record as it is retrieved
+        record = record_type(search_filter)
         results = []
         for submission in subreddit_api.new(limit=1000):
             if start <= submission.created_utc <= end:
-                results.append({key: vars(submission)[key] for key in search_filter})
+                results.append(record.from_object(submission))
 
-        # sanity check that data complete
-        self.check_data_gaps(subreddit, start, end, results, sanity=False)
+        # sanity check that data complete; praw cannot search by time so gaps are only reported
+        self.check_data_gaps(subreddit, start, end, results, sanity)
 
         return results
 
 
 class SubmissionsHybrid(Submissions):
 
-    def __init__(self, sub, credentials_file, proxies, valid_subreddit_dict=None):
-        super().__init__(sub, proxies, valid_subreddit_dict)
+    def __init__(self, sub, credentials_file, proxies, valid_subreddit_dict=None, executor=None):
+        super().__init__(sub, proxies, valid_subreddit_dict, executor)
 
         cid, cs, ua = self.get_praw_credentials(credentials_file)
-        self.praw_api_list = [Reddit(client_id=cid, client_secret=cs, user_agent=ua) for i in self.proxy_list]
-        self.api_list = [PushshiftAPI(r=self.praw_api_list[i], https_proxy=p) for i, p in enumerate(self.proxy_list)]
+        requestor_kwargs = {'rate_limiter': self.rate_limiter}
+        self.praw_api_list = [Reddit(client_id=cid, client_secret=cs, user_agent=ua,
+                                     requestor_class=RateLimitedRequestor, requestor_kwargs=requestor_kwargs)
+                              for i in self.proxy_list]
+        self.api_list = [FastPushshiftAPI(r=r, https_proxy=p, rate_limiter=self.rate_limiter)
+                         for r, p in zip(self.praw_api_list, self.proxy_list)]
+
+    def close(self):
+        super().close()
+        for api in self.api_list:
+            api.close()
 
     def get_subreddit_submissions(self, start, end, subreddit, search_filter, sanity=False):
 
         ts_now = int(datetime.today().timestamp())
 
-        # what search_submission argument would be if multi-threading not performed
-        arg_dict = {'after': start, 'before': end, 'subreddit': subreddit, 'filter': search_filter}
-
-        # generate time-sliced arguments
-        arg_dict_list = gen_slices(len(self.proxy_list), arg_dict)
-
-        # get generators that perform pushshift requests for their respective slices (using their respective proxies)
-        generator_list = [self.api_list[i].search_submissions(**arg_dict_list[i]) for i in range(len(self.proxy_list))]
-
-        # traverse the generators, each in their own thread; flatten to a list
-        submissions = [submission for result in self._map(list, generator_list) for submission in result]
+        # time-sliced search, each slice in its own thread (using its respective proxy)
+        results, failed_slices = self.search_interval(start, end, subreddit, search_filter)
 
         if 'created_utc' not in search_filter:
             search_filter.append('created_utc')
 
-        # convert submission objects to dictionaries
-        results = [{key: vars(submission)[key] for key in search_filter} for submission in submissions]
+        record = record_type(search_filter)
         s, e = localtime(start), localtime(end)
         if not results:
             latest = start
             #warn("{}: no psaw results for interval {} to {}; using praw only".format(subreddit, s, e))
         else:
-            latest = results[0]['created_utc']
+            latest = results[0].created_utc
 
         # add newer reddit posts from praw, in case psaw delayed
         if ts_now - end < 600:
@@ -199,12 +346,13 @@ class SubmissionsHybrid(Submissions):
             praw_results = []
             for submission in praw_submissions:
                 if latest < submission.created_utc <= end:
-                    praw_results.append({key: vars(submission)[key] for key in search_filter})
+                    praw_results.append(record.from_object(submission))
                 elif submission.created_utc <= latest:
                     break
             results = praw_results + results
 
-        # sanity check that data complete
-        self.check_data_gaps(subreddit, start, end, results, sanity=False)
+        # sanity check that data complete; refetch what is missing
+        gaps = failed_slices + self.check_data_gaps(subreddit, start, end, results, sanity)
+        results = self.repair_data_gaps(subreddit, results, gaps, search_filter)
 
         return results
@@ -0,0 +1,82 @@
+import json
+from collections import OrderedDict
+from hashlib import blake2b
+from os import replace
+from os.path import isfile
+from warnings import warn
+from .utils import fastjson
+
+
+class TickerCache:
+    """
+    Cache of what is extracted from a submission's texts, keyed by a hash of those texts (eg title and selftext): the
+    extracted tickers and the count of each pattern. Posts already seen (eg in overlapping windows of previous runs, or
+    reposts and crossposts with identical text) are then scored with a lookup rather than rescanned; only their score,
+    which changes, is reapplied.
+
+    Least recently used entries are evicted beyond max_size. If a filename is given, the cache is loaded from it and
+    save() writes it back (as JSON, so that loading a file never runs code), so that it can be kept across runs.
+    """
+
+    def __init__(self, filename=None, max_size=500000):
+        self.filename = filename
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        if filename and isfile(filename):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(*texts):
+        """
+        Returns the hash of the texts, separated by null characters
+        """
+        text_hash = blake2b(digest_size=16)
+        for idx, text in enumerate(texts):
+            if idx:
+                text_hash.update(b'\0')
+            text_hash.update(text.encode('utf-8', 'surrogatepass'))
+        return text_hash.digest()
+
+    def get(self, key):
+        """
+        Returns (tickers, pattern_count_dict) or None if the text has not been seen
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, tickers, pattern_count_dict):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = (tuple(tickers), pattern_count_dict)
+
+    def load(self, filename):
+        """
+        Loads the entries saved in filename, in least to most recently used order. An unreadable file (eg written by
+        an older version) is ignored with a warning.
+        """
+        try:
+            with open(filename, 'rb') as file:
+                entries = fastjson.loads(file.read())
+            self._entries = OrderedDict((bytes.fromhex(key), (tuple(tickers), pattern_count_dict))
+                                        for key, (tickers, pattern_count_dict) in entries.items())
+        except (ValueError, TypeError, AttributeError) as exception:
+            warn("Ignoring unreadable ticker cache {}: {}".format(filename, exception))
+            self._entries = OrderedDict()
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        if self.filename:
+            entries = {key.hex(): [list(tickers), pattern_count_dict]
+                       for key, (tickers, pattern_count_dict) in self._entries.items()}
+            tmp_filename = self.filename + '.tmp'
+            with open(tmp_filename, 'w', encoding='utf-8') as file:
+                json.dump(entries, file, ensure_ascii=False, separators=(',', ':'))
+            replace(tmp_filename, self.filename)
@@ -1,4 +1,5 @@
 name = "autodd"
 __version__ = '0.0.2'
 from .FastYahoo import FastYahoo
-from .Submissions import SubmissionsPsaw, SubmissionsPraw, SubmissionsHybrid
\ No newline at end of file
+from .Submissions import SubmissionsPsaw, SubmissionsPraw, SubmissionsHybrid
+from .Pipeline import Pipeline
@@ -1,75 +1,104 @@
 import re
 import pandas as pd
+from .ScoreMatrix import ScoreMatrix
 from datetime import datetime
 from tabulate import tabulate
 from locale import getpreferredencoding
 
-def get_ticker_scores(subreddit_results_dict, pattern_list):
+# Python regex pattern for stocks codes
+ticker_pattern = re.compile(r'(?<=\$)?\b[A-Z]{3,5}\b(?:\.[A-Z]{1,2})?')
+
+
+def extract_tickers(*texts):
+    """
+    Returns the set of tickers found in the texts of a submission (eg its title and text body) or comment
     """
-    Returns a dataframe:
+    # search each text for the ticker/tickers
+    extracted_tickers = set()
+    for text in texts:
+        extracted_tickers.update(ticker_pattern.findall(text))
+
+    # brk.b recognized by yahoo as brk-b; on the other hand aab.to is recognized as aab.to
+    # so add both '.' and '_' versions and will let yahoo remove the invalid ones
+    return {x for ticker in extracted_tickers for x in (ticker.replace('.', '_'), ticker)}
+
+
+def get_ticker_scores(subreddit_results_dict, pattern_list, ticker_index=None, ticker_cache=None,
+                      text_fields=('title', 'selftext')):
+    """
+    Returns two score matrices, sharing ticker_index (a new one if not provided):
     --one column per requested pattern -- ie number of instances of the pattern for each ticker
     --one column per subreddit; each column contains the score for each ticker in that subreddit
 
-    :param subreddit_results_dict: A dictionary of results for each subreddit, as outputted by get_submissions
+    :param subreddit_results_dict: A dictionary of results for each subreddit, as outputted by get_submissions (or
+    get_comments); the results are only traversed once, so they can be generators
     :param pattern_list: a list of patterns to search for
+    :param ticker_index: TickerIndex shared with other score matrices, eg those of another time interval
+    :param ticker_cache: optional TickerCache; submissions whose text is in the cache are not rescanned
+    :param text_fields: the fields of each result searched for tickers and patterns
     """
 
-    # Python regex pattern for stocks codes
-    ticker_pattern = r'(?<=\$)?\b[A-Z]{3,5}\b(?:\.[A-Z]{1,2})?'
+    # Matrix containing the summaries
+    subreddit_scores = ScoreMatrix(subreddit_results_dict.keys(), ticker_index)
+    ticker_index = subreddit_scores.ticker_index
 
-    # Dictionaries containing the summaries
-    subreddit_scores_dict = {subreddit: {} for subreddit in subreddit_results_dict.keys()}
-
-    # Dictionaries containing the pattern count
-    pattern_scores_dict = {pattern: {} for pattern in pattern_list}
+    # Matrix containing the pattern count
+    pattern_scores = ScoreMatrix(pattern_list, ticker_index)
 
     for subreddit, submission_list in subreddit_results_dict.items():
         # looping over each submission
-        for submission_dict in submission_list:
-            score = submission_dict.get('score', 1) - 1
-
-            # search the title for the ticker/tickers
-            title = submission_dict.get('title', '')
-            title_tickers = set(re.findall(ticker_pattern, title))
-
-            # search the text body for the ticker/tickers
-            selftext = submission_dict.get('selftext', '')
-            selftext_tickers = set(re.findall(ticker_pattern, selftext))
-
-            extracted_tickers = selftext_tickers.union(title_tickers)
-            # brk.b recognized by yahoo as brk-b; on the other hand aab.to is recognized as aab.to
-            # so add both '.' and '_' versions and will let yahoo remove the invalid ones
-            extracted_tickers = {x for ticker in extracted_tickers for x in (ticker.replace('.', '_'), ticker)}
-
-            for ticker in extracted_tickers:
-                for pattern in pattern_scores_dict:
-                    count_pattern = title.count(pattern) + selftext.count(pattern)
-                    pattern_scores_dict[pattern][ticker] = pattern_scores_dict[pattern].get(ticker, 0) + count_pattern
-
-            for ticker in extracted_tickers:
-                subreddit_scores_dict[subreddit][ticker] = subreddit_scores_dict[subreddit].get(ticker, 0) + score
-
-    scores_df = pd.DataFrame.from_dict(subreddit_scores_dict).fillna(value=0).astype('int32')
-    scores_df.index.name = 'Ticker'
-    pattern_df = pd.DataFrame.from_dict(pattern_scores_dict).fillna(value=0).astype('int32')
-    return scores_df, pattern_df
-
-def gen_delta_df(current_scores_df, prev_scores_df, interval):
+        for submission in submission_list:
+            score = submission.get('score', 1) - 1
+
+            texts = [submission.get(field) or '' for field in text_fields]
+
+            # look up the tickers and pattern counts of already seen texts; scan the others
+            cached = None
+            if ticker_cache is not None:
+                key = ticker_cache.key(*texts)
+                cached = ticker_cache.get(key)
+            if cached is not None and all(pattern in cached[1] for pattern in pattern_list):
+                extracted_tickers, pattern_count_dict = cached
+            else:
+                extracted_tickers = tuple(extract_tickers(*texts))
+                pattern_count_dict = {p: sum(text.count(p) for text in texts) for p in pattern_list}
+                if ticker_cache is not None:
+                    ticker_cache.put(key, extracted_tickers, pattern_count_dict)
+
+            if not extracted_tickers:
+                continue
+
+            ticker_ids = [ticker_index.intern(ticker) for ticker in extracted_tickers]
+            subreddit_scores.reserve(len(ticker_index))
+            pattern_scores.reserve(len(ticker_index))
+
+            for pattern in pattern_list:
+                count_pattern = pattern_count_dict[pattern]
+                pattern_column = pattern_scores.column(pattern)
+                for ticker_id in ticker_ids:
+                    pattern_column[ticker_id] += count_pattern
+
+            subreddit_column = subreddit_scores.column(subreddit)
+            for ticker_id in ticker_ids:
+                subreddit_column[ticker_id] += score
+                subreddit_scores.mark(ticker_id)
+                pattern_scores.mark(ticker_id)
+
+    return subreddit_scores, pattern_scores
+
+def gen_delta_scores(current_scores, prev_scores, interval):
     """
-    Combine two score dataframes, one from the current time interval, and one from the past time interval
-    :returns: dataframe containing total score, score of current interval, score of prev interval, and delta
+    Combine two score matrices, one from the current time interval, and one from the past time interval
+    :returns: score matrix containing total score, score of current interval, score of prev interval, and delta
     """
-    recent = current_scores_df.sum(axis=1)
-    prev = prev_scores_df.sum(axis=1)
-    total = recent.add(prev, fill_value=0)
-    change = recent.subtract(prev, fill_value=0)
+    recent = current_scores.row_sums()
+    prev = prev_scores.row_sums()
 
     first_col = str(interval) + 'H Total'
-    columns = [first_col, 'Prev', 'Recent', 'Change']
-    df = pd.concat([total, prev, recent, change], axis=1).fillna(value=0).astype('int32')
-    df.columns = columns
+    values_dict = {first_col: recent + prev, 'Prev': prev, 'Recent': recent, 'Change': recent - prev}
+    presence = current_scores.presence() | prev_scores.presence()
 
-    return df
+    return ScoreMatrix.from_values(current_scores.ticker_index, values_dict, presence)
 
 
 def filter_df(df, min_val):
@@ -98,7 +127,11 @@ def filter_df(df, min_val):
     return df
 
 
-def print_df(df, filename, writecsv):
+def print_df(df, filename, writecsv, mode='a', verbose=True):
+    """
+    Writes the dd table to filename (.csv or .txt appended): appended to the file by default, or overwriting it if
+    mode is 'w' (eg for a live table refreshed as data arrives)
+    """
 
     # turn index (symbols) into regular column for printing purposes
     df.reset_index(inplace=True)
@@ -109,17 +142,18 @@ def print_df(df, filename, writecsv):
 
     if writecsv:
         filename += '.csv'
-        df.to_csv(filename, index=False, float_format='%.3f', mode='a', encoding=getpreferredencoding())
+        df.to_csv(filename, index=False, float_format='%.3f', mode=mode, encoding=getpreferredencoding())
         print(file=open(filename, "a"))
     else:
         filename += '.txt'
-        with open(filename, "a") as file:
+        with open(filename, mode) as file:
             file.write("date and time now = ")
             file.write(dt_string)
             file.write('\n')
             file.write(tabulate(df, headers='keys', floatfmt='.3f', showindex=False))
             file.write('\n\n')
 
-    print("Wrote to file successfully: ")
-    print(filename)
+    if verbose:
+        print("Wrote to file successfully: ")
+        print(filename)
 
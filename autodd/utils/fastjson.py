@@ -0,0 +1,10 @@
+"""
+JSON decoding straight from raw response bytes. Uses orjson when it is installed and falls back to the standard library
+otherwise; both accept bytes, so callers never need to decode the response body to text first.
+"""
+try:
+    from orjson import loads
+    decoder = 'orjson'
+except ImportError:
+    from json import loads
+    decoder = 'json'
@@ -3,4 +3,6 @@ from warnings import filterwarnings
 bad_warning1 = "Unable to connect to pushshift.io. Retrying after backoff."
 bad_warning2 = "Got non 200 code"
 filterwarnings("ignore", message=bad_warning1, module="psaw")
-filterwarnings("ignore", message=bad_warning2, module="psaw")
\ No newline at end of file
+filterwarnings("ignore", message=bad_warning2, module="psaw")
+filterwarnings("ignore", message=bad_warning1, module="autodd.FastPushshift")
+filterwarnings("ignore", message=bad_warning2, module="autodd.FastPushshift")
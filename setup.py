@@ -12,6 +12,11 @@ INSTALL_REQUIRES = [
 TEST_REQUIRES = [
 ]
 
+# optional: faster decoding of yahoo and pushshift responses
+FAST_REQUIRES = [
+    "orjson"
+]
+
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
@@ -29,6 +34,7 @@ setup(
     install_requires=INSTALL_REQUIRES,
     extras_require={
         "test": TEST_REQUIRES,
+        "fast": FAST_REQUIRES,
     },
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
@@ -18,9 +18,9 @@ hybrid_results = submissions_api_hybrid.get_submissions(after=ts_start, before=t
 
 for search_filter in ['title']:
     for subreddit, results in psaw_results.items():
-        for idx, submission_dict in enumerate(results):
-            if search_filter in submission_dict:
-                psaw_results[subreddit][idx][search_filter] = unescape(submission_dict[search_filter])
+        for submission in results:
+            if submission.get(search_filter) is not None:
+                setattr(submission, search_filter, unescape(submission.get(search_filter)))
 
     mismatches=0
     for key in psaw_results.keys():
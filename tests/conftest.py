@@ -0,0 +1,100 @@
+import json
+import sys
+from os.path import dirname, abspath
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from autodd.RateLimiter import RateLimiter  # noqa: E402
+from autodd.Submissions import Submissions, SubmissionsPsaw  # noqa: E402
+
+# pushshift thing as returned by psaw: fields as attributes, and the raw dictionary as d_
+Thing = namedtuple('Thing', ['title', 'body', 'score', 'created_utc', 'd_'])
+
+
+def make_thing(created_utc, title='GME', body='GME', score=2):
+    d = {'title': title, 'body': body, 'score': score, 'created_utc': created_utc}
+    return Thing(d_=d, **d)
+
+
+class FakePushshift:
+    """
+    Stands in for a FastPushshiftAPI: serves things (in descending order of creation time) between after and before,
+    and raises on the first fail_calls searches.
+    """
+
+    def __init__(self, things, fail_calls=0, fail_after=0):
+        self.things = sorted(things, key=lambda thing: -thing.created_utc)
+        self.fail_calls = fail_calls
+        self.fail_after = fail_after
+        self.calls = []
+
+    def search(self, after, before, subreddit, filter):
+        self.calls.append((after, before))
+        fail = self.fail_calls > 0
+        if fail:
+            self.fail_calls -= 1
+        for n, thing in enumerate(thing for thing in self.things if after < thing.created_utc < before):
+            if fail and n >= self.fail_after:
+                raise ConnectionError('pushshift unavailable')
+            yield thing
+        if fail:
+            raise ConnectionError('pushshift unavailable')
+
+    search_submissions = search
+    search_comments = search
+
+    def close(self):
+        pass
+
+
+class FakeYahoo:
+    """
+    Stands in for the get of a yahoo session: quotes the tickers in prices (only their float if their price is None),
+    and returns the same advanced stats for any of them. Records the tickers whose advanced stats were requested.
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.summary_symbols = []
+
+    def __call__(self, url, params=None, **kwargs):
+        if 'quoteSummary' in url:
+            symbol = url.rsplit('/', 1)[1]
+            self.summary_symbols.append(symbol)
+            stats = {'industry': 'Retail', 'beta': {'raw': 1.5}, 'currentPrice': {'raw': self.prices[symbol]}}
+            content = {'quoteSummary': {'result': [{module: stats for module in params['modules'].split(',')}]}}
+        else:
+            quotes = []
+            for symbol in params['symbols'].split(','):
+                if symbol in self.prices:
+                    price = self.prices[symbol]
+                    quote = {'symbol': symbol, 'floatShares': 1000}
+                    if price is not None:
+                        quote.update(regularMarketPrice=price, regularMarketPreviousClose=price)
+                    quotes.append(quote)
+            content = {'quoteResponse': {'result': quotes}}
+        return SimpleNamespace(status_code=200, headers={}, content=json.dumps(content).encode())
+
+
+@pytest.fixture
+def make_psaw():
+    """
+    Returns a factory of SubmissionsPsaw whose apis are the given fakes (one per proxy), without any http request
+    """
+    created = []
+
+    def make(api_list, sub='wallstreetbets'):
+        proxies = SimpleNamespace(proxy_list=[''] * len(api_list), rate_limiter=RateLimiter())
+        submissions_api = SubmissionsPsaw.__new__(SubmissionsPsaw)
+        Submissions.__init__(submissions_api, sub, proxies)
+        submissions_api.api_list = api_list
+        created.append(submissions_api)
+        return submissions_api
+
+    yield make
+    for submissions_api in created:
+        submissions_api.close()
@@ -0,0 +1,61 @@
+import pytest
+
+from autodd.Comments import Comments
+from autodd.utils import timeslice
+from conftest import FakePushshift, make_thing
+
+START, END = 1000, 5000
+
+THINGS = [make_thing(t, body='TSLA {}'.format(t), score=1) for t in range(END - 1, START, -3)]
+
+
+def created(comments):
+    return sorted(comment.created_utc for comment in comments)
+
+
+def test_comments_are_streamed_in_batches(make_psaw):
+    comments_api = Comments(make_psaw([FakePushshift(THINGS), FakePushshift(THINGS)]), batch_size=10, max_batches=2)
+    stream = comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets']
+
+    comments = list(stream)
+
+    assert created(comments) == created(THINGS)
+    assert comments[0].body.startswith('TSLA')
+
+
+def test_slice_failing_part_way_is_streamed_again_over_healthy_proxies(make_psaw):
+    api_list = [FakePushshift(THINGS), FakePushshift(THINGS, fail_calls=1, fail_after=250), FakePushshift(THINGS)]
+    submissions_api = make_psaw(api_list)
+    comments_api = Comments(submissions_api, batch_size=100, max_batches=2)
+
+    with pytest.warns(UserWarning, match='failed on proxy 1'):
+        comments = list(comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets'])
+
+    # all comments but those on the boundaries between slices, which pushshift searches exclude
+    boundaries = set(timeslice(START, END, len(api_list)))
+    assert created(comments) == created(thing for thing in THINGS if thing.created_utc not in boundaries)
+    assert submissions_api.healthy_api_indices == {0, 2}
+
+
+def test_failure_on_the_only_proxy_is_skipped_then_recovers(make_psaw):
+    api = FakePushshift(THINGS, fail_calls=1, fail_after=250)
+    comments_api = Comments(make_psaw([api]), batch_size=100)
+
+    with pytest.warns(UserWarning, match='no healthy proxy'):
+        comments = list(comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets'])
+    assert len(comments) == 200
+
+    comments = list(comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets'])
+    assert created(comments) == created(THINGS)
+
+
+def test_stopping_early_releases_the_producers(make_psaw):
+    submissions_api = make_psaw([FakePushshift(THINGS), FakePushshift(THINGS)])
+    comments_api = Comments(submissions_api, batch_size=10, max_batches=1)
+    stream = comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets']
+
+    assert next(stream).created_utc == THINGS[0].created_utc
+    stream.close()
+
+    # producers have returned: the executor is free for the next stream
+    assert len(list(comments_api.get_comments(START, END, ['body', 'score'])['wallstreetbets'])) > 0
@@ -0,0 +1,163 @@
+import json
+from threading import Event
+from time import sleep
+from types import SimpleNamespace
+
+import pytest
+
+from autodd.CircuitBreaker import CircuitBreaker
+from autodd.FastYahoo import FastYahoo
+from autodd.Financials import Financials
+from autodd.RateLimiter import RateLimiter
+
+SUMMARY_URL = 'https://query2.finance.yahoo.com/v10/finance/quoteSummary/GME'
+
+
+def response(status_code, content=None):
+    return SimpleNamespace(status_code=status_code, headers={}, content=json.dumps(content or {}).encode())
+
+
+def summary(beta=1.5):
+    return response(200, {'quoteSummary': {'result': [{'summaryDetail': {'beta': {'raw': beta}}}]}})
+
+
+def make_yahoo(gets, **kwargs):
+    """
+    FastYahoo with one (fake) proxy per get function, without rate limits
+    """
+    host_rates = {'query1.finance.yahoo.com': 1000, 'query2.finance.yahoo.com': 1000}
+    proxies = SimpleNamespace(proxy_list=['proxy{}'.format(i) for i in range(len(gets))],
+                              rate_limiter=RateLimiter(host_rates, max_concurrency=64))
+    kwargs.setdefault('backoff', 0.001)
+    fast_yahoo = FastYahoo(proxies=proxies, **kwargs)
+    for session, get in zip(fast_yahoo.sessions, gets):
+        session.get = get
+    return fast_yahoo
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(max_failures=2, reset_timeout=0.05)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.is_open and not breaker.allow()
+
+    sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+
+    sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert not breaker.is_open and breaker.allow()
+
+
+def test_transient_errors_are_retried():
+    responses = [response(503), response(500), summary()]
+    fast_yahoo = make_yahoo([lambda url, **kwargs: responses.pop(0)])
+    assert fast_yahoo.get_ticker_stats('GME', {'summaryDetail': {'beta': 'beta'}}) is not None
+    assert responses == []
+    fast_yahoo.close()
+
+
+def test_open_circuit_fails_fast_with_na_stats():
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        return response(503)
+
+    fast_yahoo = make_yahoo([get], threads=False, max_retries=0, max_failures=3)
+    with pytest.warns(UserWarning):
+        stats_df = fast_yahoo.download_advanced_stats(['S{}'.format(i) for i in range(10)],
+                                                      {'summaryDetail': {'beta': 'beta'}})
+    assert (stats_df['beta'] == 'N/A').all()
+    assert len(calls) == 3
+    assert fast_yahoo.breaker(SUMMARY_URL).is_open
+    fast_yahoo.close()
+
+
+def test_failed_quick_stats_batch_keeps_its_tickers_with_na_stats():
+    financials = Financials(threads=False)
+    financials.fast_yahoo.max_retries = 0
+    financials.fast_yahoo.sessions[0].get = lambda url, **kwargs: response(503)
+    with pytest.warns(UserWarning, match='2 tickers'):
+        quick_stats_df = financials.get_quick_stats(['GME', 'AMC'])
+    assert list(quick_stats_df.index) == ['GME', 'AMC']
+    assert (quick_stats_df == 'N/A').all().all()
+    financials.close()
+
+
+def test_ticker_without_stats_is_invalid():
+    quotes = {'quoteResponse': {'result': [{'symbol': 'GME', 'regularMarketPrice': 40.0,
+                                            'regularMarketPreviousClose': 38.0}, {'symbol': 'LOL'}]}}
+    financials = Financials(threads=False)
+    financials.fast_yahoo.sessions[0].get = lambda url, **kwargs: response(200, quotes)
+    quick_stats_df = financials.get_quick_stats(['GME', 'LOL'])
+    assert list(quick_stats_df.index) == ['GME']
+    assert quick_stats_df.loc['GME', 'Price'] == 40.0
+    financials.close()
+
+
+def test_response_that_is_not_json_gives_na_stats():
+    def get(url, **kwargs):
+        if url.endswith('AMC'):
+            return SimpleNamespace(status_code=200, headers={}, content=b'<html>Bad gateway</html>')
+        return summary()
+
+    fast_yahoo = make_yahoo([get], threads=False, max_retries=0)
+    with pytest.warns(UserWarning, match='not JSON'):
+        stats_df = fast_yahoo.download_advanced_stats(['GME', 'TSLA', 'AMC'], {'summaryDetail': {'beta': 'beta'}})
+    assert list(stats_df['beta']) == [1.5, 1.5, 'N/A']
+    assert fast_yahoo.breaker(SUMMARY_URL).failures == 1
+    fast_yahoo.close()
+
+
+def test_no_hedging_without_threads():
+    fast_yahoo = FastYahoo(threads=False)
+    assert fast_yahoo._hedge_executor is None and fast_yahoo.hedge_percentile is None
+    fast_yahoo.close()
+
+
+def test_slow_request_is_hedged_through_a_proxy_whose_circuit_is_closed():
+    release = Event()
+    calls = []
+
+    def get(proxy_index, slow):
+        def proxy_get(url, **kwargs):
+            calls.append(proxy_index)
+            if slow:
+                release.wait(5)
+            return summary(beta=proxy_index)
+        return proxy_get
+
+    fast_yahoo = make_yahoo([get(0, True), get(1, False), get(2, False)])
+    fast_yahoo._latencies['query2.finance.yahoo.com'] = [0.001] * fast_yahoo.min_latency_samples
+    for _ in range(fast_yahoo.max_failures):
+        fast_yahoo.breaker(SUMMARY_URL, 1).failure()
+
+    # primary through proxy 0 is slow; proxy 1's circuit is open so the hedge goes through proxy 2
+    result = fast_yahoo.hedged_get(SUMMARY_URL, {}, 0)
+    release.set()
+
+    assert json.loads(result.content)['quoteSummary']['result'][0]['summaryDetail']['beta']['raw'] == 2
+    assert 1 not in calls
+    assert fast_yahoo.breaker(SUMMARY_URL, 2).failures == 0
+    fast_yahoo.close()
+
+
+def test_failed_hedge_counts_towards_its_proxy_circuit_and_loses_to_the_primary():
+    def slow_get(url, **kwargs):
+        sleep(0.2)
+        return summary()
+
+    fast_yahoo = make_yahoo([slow_get, lambda url, **kwargs: response(503)])
+    fast_yahoo._latencies['query2.finance.yahoo.com'] = [0.001] * fast_yahoo.min_latency_samples
+
+    result = fast_yahoo.hedged_get(SUMMARY_URL, {}, 0)
+
+    assert result.status_code == 200
+    assert fast_yahoo.breaker(SUMMARY_URL, 1).failures == 1
+    fast_yahoo.close()
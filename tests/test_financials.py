@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from autodd.Financials import Financials
+from conftest import FakeYahoo
+
+PRICES = {'GME': 40.0, 'AMC': 5.0, 'TSLA': 700.0}
+
+
+def make_financials(prices=PRICES):
+    financials = Financials(threads=False)
+    financials.fast_yahoo.sessions[0].get = FakeYahoo(prices)
+    return financials
+
+
+def scores(total_dict):
+    results_df = pd.DataFrame({'Total': total_dict, 'Recent': {ticker: 1 for ticker in total_dict}})
+    results_df.index.name = 'Code'
+    return results_df
+
+
+def test_module_name_map_only_has_the_modules_of_the_requested_columns():
+    assert Financials.get_module_name_map(['beta', 'Trgtmean', 'open']) == {
+        'summaryDetail': {'beta': 'beta', 'open': 'open'},
+        'financialData': {'targetMeanPrice': 'Trgtmean'},
+    }
+    # quick stats columns need no per-ticker request
+    assert Financials.get_module_name_map(['Price', '1DayChange%'], advanced=True) == {}
+    assert Financials.get_module_name_map() == {'summaryProfile': {'industry': 'Industry'},
+                                                'defaultKeyStatistics': {'shortPercentOfFloat': 'Short/Float%'}}
+
+
+def test_invalid_column_is_rejected():
+    with pytest.raises(ValueError, match="Invalid column 'Moon'"):
+        Financials.get_module_name_map(['beta', 'Moon'])
+
+
+def test_only_the_score_columns_and_requested_columns_are_output():
+    financials = make_financials()
+    df = financials.get_financial_stats(scores({'GME': 30, 'AMC': 20}), columns=['beta', 'Price', 'CrntPrice'])
+    assert list(df.columns) == ['Total', 'Recent', 'beta', 'Price', 'CrntPrice']
+    assert df.loc['GME', 'Price'] == df.loc['GME', 'CrntPrice'] == 40.0
+    financials.close()
+
+
+def test_max_price_keeps_the_tickers_without_a_price():
+    financials = make_financials({'GME': 40.0, 'AMC': 5.0, 'TSLA': 700.0, 'NOK': None})
+    df = financials.get_financial_stats(scores({'GME': 30, 'AMC': 20, 'TSLA': 10, 'NOK': 5}), max_price=50)
+    assert list(df.index) == ['GME', 'AMC', 'NOK']
+    financials.close()
+
+
+def test_top_is_applied_to_the_valid_tickers():
+    financials = make_financials()
+    fake_yahoo = financials.fast_yahoo.sessions[0].get
+    # LOL scores highest but is not a valid ticker: it does not take one of the top slots
+    df = financials.get_financial_stats(scores({'LOL': 50, 'GME': 30, 'TSLA': 20, 'AMC': 10}), top=2,
+                                        sort_column='Total')
+    assert sorted(df.index) == ['GME', 'TSLA']
+    assert sorted(fake_yahoo.summary_symbols) == ['GME', 'TSLA']
+    financials.close()
+
+
+def test_top_defaults_to_the_first_column():
+    financials = make_financials()
+    df = financials.get_financial_stats(scores({'GME': 30, 'TSLA': 20, 'AMC': 10}), top=1)
+    assert list(df.index) == ['GME']
+    financials.close()
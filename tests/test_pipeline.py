@@ -0,0 +1,63 @@
+import pytest
+
+from autodd.Financials import Financials
+from autodd.Pipeline import Pipeline
+from autodd.Record import record_type
+from conftest import FakeYahoo
+
+PRICES = {'GME': 40.0, 'AMC': 5.0, 'TSLA': 700.0}
+
+
+class FakeSubmissions:
+    """
+    Serves the same submissions in every time window: GME scores highest, then TSLA, then AMC
+    """
+
+    def get_submissions(self, start, end, search_filter, sanity_list=()):
+        record = record_type(search_filter)
+        submissions = [record.from_mapping({'title': title, 'selftext': '', 'score': score, 'created_utc': end - 1})
+                       for title, score in (('GME', 300), ('TSLA', 200), ('AMC', 100))]
+        return {'wallstreetbets': submissions}
+
+    def close(self):
+        pass
+
+
+def make_pipeline():
+    pipeline = Pipeline(db='psaw', threads=False)
+    pipeline._submissions_apis[''] = FakeSubmissions()
+    fake_yahoo = FakeYahoo(PRICES)
+    for session in pipeline.financials.fast_yahoo.sessions:
+        session.get = fake_yahoo
+    return pipeline, fake_yahoo
+
+
+def test_updates_go_from_scores_to_the_complete_table_in_score_order():
+    updates = []
+    pipeline, fake_yahoo = make_pipeline()
+    with pipeline:
+        results_df = pipeline.run(min_score=0, advanced=True, on_update=updates.append)
+
+    score_columns = list(updates[0].columns)
+    assert 'Price' not in score_columns and list(updates[0].index) == ['GME', 'TSLA', 'AMC']
+    # then the quick stats, then the complete table
+    assert list(updates[1].columns) == score_columns + Financials.quick_stats_columns
+    assert updates[-1].equals(results_df)
+    assert 'CrntPrice' in results_df.columns and list(results_df.index) == ['GME', 'TSLA', 'AMC']
+    assert fake_yahoo.summary_symbols == ['GME', 'TSLA', 'AMC']
+
+
+def test_subreddit_column_only_when_more_than_one_subreddit_scored():
+    pipeline, _ = make_pipeline()
+    with pipeline:
+        results_df = pipeline.get_scores(24, '', 0)
+    assert 'wallstreetbets' not in results_df.columns
+    assert list(results_df.columns) == ['24H Total', 'Prev', 'Recent', 'Change', 'Rockets']
+
+
+def test_comments_with_praw_fail_before_any_request():
+    pipeline = Pipeline(db='praw', threads=False)
+    with pipeline, pytest.raises(ValueError, match='pushshift'):
+        pipeline.run(comments=True)
+    # the submissions api (which would log in to reddit) was never created
+    assert pipeline._submissions_apis == {}
@@ -0,0 +1,53 @@
+from time import monotonic
+from types import SimpleNamespace
+
+from autodd.RateLimiter import RateLimiter, TokenBucket
+
+
+def response(status_code, retry_after=None):
+    headers = {} if retry_after is None else {'Retry-After': retry_after}
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def test_bucket_starts_at_most_burst_then_rate_requests():
+    bucket = TokenBucket(rate=50, burst=1)
+    start = monotonic()
+    for _ in range(6):
+        bucket.acquire()
+        bucket.release()
+    assert monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_bucket_halves_rate_when_throttled_and_recovers():
+    bucket = TokenBucket(rate=10)
+    bucket.update(429)
+    assert bucket.rate == 5
+    bucket.update(200)
+    assert bucket.rate == 5.5
+    for _ in range(20):
+        bucket.update(200)
+    assert bucket.rate == 10
+
+
+def test_retry_after_blocks_the_bucket():
+    limiter = RateLimiter()
+    limiter.call('https://api.pushshift.io/meta', '', lambda: response(429, '0.2'))
+    bucket = limiter.bucket('https://api.pushshift.io/reddit/search')
+    start = monotonic()
+    bucket.acquire()
+    bucket.release()
+    assert monotonic() - start >= 0.15
+
+
+def test_buckets_are_per_host_and_proxy():
+    limiter = RateLimiter()
+    assert limiter.bucket('https://api.pushshift.io/a') is limiter.bucket('https://api.pushshift.io/b')
+    assert limiter.bucket('https://api.pushshift.io/a') is not limiter.bucket('https://api.pushshift.io/a', 'proxy')
+    assert limiter.bucket('https://www.reddit.com/').max_rate == 1
+
+
+def test_retry_after_header_formats():
+    assert RateLimiter.retry_after(response(429, '3')) == 3
+    assert RateLimiter.retry_after(response(429, 'Wed, 21 Oct 2015 07:28:00 GMT')) == 0
+    assert RateLimiter.retry_after(response(429, 'soon')) is None
+    assert RateLimiter.retry_after(response(200)) is None
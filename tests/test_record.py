@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import pytest
+
+from autodd.Record import record_type
+
+
+def test_record_holds_requested_fields_and_created_utc():
+    record = record_type(['title', 'score']).from_mapping({'title': 'GME', 'score': 3, 'created_utc': 10, 'id': 'x'})
+    assert type(record).__slots__ == ('title', 'score', 'created_utc')
+    assert (record.title, record.score, record.created_utc) == ('GME', 3, 10)
+    assert record.to_dict() == {'title': 'GME', 'score': 3, 'created_utc': 10}
+    assert not hasattr(record, '__dict__')
+
+
+def test_missing_fields_behave_like_dict_get():
+    record = record_type(['title', 'selftext']).from_object(SimpleNamespace(title='GME', created_utc=10))
+    assert record.get('selftext') is None
+    assert record.get('selftext', '') == ''
+    assert record.get('score', 1) == 1
+    with pytest.raises(AttributeError):
+        record.selftext
+
+
+def test_record_types_are_shared_per_field_set():
+    assert record_type(['title']) is record_type(['title', 'created_utc'])
+    assert record_type(['title']) is not record_type(['body'])
@@ -0,0 +1,55 @@
+import pytest
+
+from autodd.Record import record_type
+from autodd.ScoreMatrix import ScoreMatrix, TickerIndex
+from autodd.scores import get_ticker_scores, gen_delta_scores
+
+
+def posts(*texts_scores):
+    record = record_type(['title', 'selftext', 'score'])
+    return [record.from_mapping({'title': title, 'selftext': '', 'score': score, 'created_utc': 0})
+            for title, score in texts_scores]
+
+
+def test_matrices_sharing_an_index_merge_and_concat_without_reindexing():
+    ticker_index = TickerIndex()
+    a = ScoreMatrix(['wsb'], ticker_index)
+    b = ScoreMatrix(['wsb', 'stocks'], ticker_index)
+    gme, amc = ticker_index.intern('GME'), ticker_index.intern('AMC')
+    a.reserve(len(ticker_index))
+    b.reserve(len(ticker_index))
+    a.column('wsb')[gme] += 3
+    a.mark(gme)
+    b.column('stocks')[amc] += 2
+    b.mark(amc)
+
+    merged = a.merge(b)
+    assert merged.columns == ['wsb', 'stocks']
+    assert merged.to_frame().to_dict('index') == {'GME': {'wsb': 3, 'stocks': 0}, 'AMC': {'wsb': 0, 'stocks': 2}}
+
+    with pytest.raises(ValueError):
+        a.concat(b)
+    with pytest.raises(ValueError):
+        a.merge(ScoreMatrix(['wsb']))
+
+
+def test_select_only_returns_present_tickers_above_min():
+    ticker_index = TickerIndex()
+    for ticker in ('GME', 'AMC', 'TSLA'):
+        ticker_index.intern(ticker)
+    matrix = ScoreMatrix.from_values(ticker_index, {'total': [5, 1, 9]}, [True, True, False])
+    assert list(matrix.select('total', 2)) == [0]
+    assert len(matrix) == 2
+
+
+def test_ticker_scores_and_deltas():
+    ticker_index = TickerIndex()
+    recent, recent_rockets = get_ticker_scores({'wsb': posts(('GME 🚀🚀', 11), ('GME AMC', 1))}, ['🚀'], ticker_index)
+    prev, prev_rockets = get_ticker_scores({'wsb': posts(('AMC', 5))}, ['🚀'], ticker_index)
+
+    assert recent.to_frame().to_dict('index') == {'GME': {'wsb': 10}, 'AMC': {'wsb': 0}}
+    assert recent_rockets.to_frame().loc['GME', '🚀'] == 2
+
+    delta = gen_delta_scores(recent, prev, 24).to_frame()
+    assert delta.loc['GME'].tolist() == [10, 0, 10, 10]
+    assert delta.loc['AMC'].tolist() == [4, 4, 0, -4]
@@ -0,0 +1,61 @@
+import pytest
+
+from autodd.Record import record_type
+from autodd.Submissions import Submissions
+from conftest import FakePushshift, make_thing
+
+START, END = 50000, 100000
+
+# one submission every 5 minutes
+THINGS = [make_thing(t) for t in range(END - 100, START, -300)]
+
+
+def created(results):
+    return [result.created_utc for result in results]
+
+
+def test_check_data_gaps_finds_interior_and_edge_gaps():
+    record = record_type(['title'])
+    results = [record.from_mapping({'title': 'GME', 'created_utc': t}) for t in (END - 600, 80000, 70000, START + 600)]
+    with pytest.warns(UserWarning):
+        gaps = Submissions.check_data_gaps('wallstreetbets', START, END, results, sanity=True)
+    assert gaps == [(80000, END - 600), (70000, 80000), (START + 600, 70000)]
+    assert Submissions.check_data_gaps('wallstreetbets', START, END, results) == []
+
+
+def test_failed_slice_is_refetched_over_healthy_proxies(make_psaw):
+    api_list = [FakePushshift(THINGS), FakePushshift(THINGS, fail_calls=1), FakePushshift(THINGS)]
+    submissions_api = make_psaw(api_list)
+
+    with pytest.warns(UserWarning):
+        results = submissions_api.get_subreddit_submissions(START, END, 'wallstreetbets', ['title', 'score'])
+
+    assert created(results) == created(THINGS)
+    assert submissions_api.healthy_api_indices == {0, 2}
+
+
+def test_single_proxy_failure_warns_then_recovers(make_psaw):
+    api = FakePushshift(THINGS, fail_calls=1, fail_after=10)
+    submissions_api = make_psaw([api])
+
+    # the failed slice cannot be refetched: no error, only a warning and what could be retrieved (nothing)
+    with pytest.warns(UserWarning, match='no healthy proxy'):
+        results = submissions_api.get_submissions(START, END, ['title', 'score'])['wallstreetbets']
+    assert results == []
+
+    # the proxy is healthy again for the next search
+    results = submissions_api.get_submissions(START, END, ['title', 'score'])['wallstreetbets']
+    assert created(results) == created(THINGS)
+    assert len(api.calls) == 2
+
+
+def test_repair_keeps_only_submissions_strictly_inside_gaps(make_psaw):
+    submissions_api = make_psaw([FakePushshift(THINGS)])
+    record = record_type(['title', 'score'])
+    results = [record.from_mapping(thing.d_) for thing in THINGS if not 70000 <= thing.created_utc <= 80000]
+    boundaries = [thing.created_utc for thing in THINGS if thing.created_utc < 70000][:1] + \
+                 [thing.created_utc for thing in THINGS if thing.created_utc > 80000][-1:]
+
+    repaired = submissions_api.repair_data_gaps('wallstreetbets', results, [tuple(boundaries)], ['title', 'score'])
+
+    assert created(repaired) == created(THINGS)
@@ -0,0 +1,56 @@
+import pickle
+
+import pytest
+
+from autodd.TickerCache import TickerCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TickerCache(max_size=2)
+    a, b, c = TickerCache.key('a'), TickerCache.key('b'), TickerCache.key('c')
+    cache.put(a, ('GME',), {'🚀': 1})
+    cache.put(b, ('AMC',), {'🚀': 0})
+    assert cache.get(a) is not None
+    cache.put(c, ('TSLA',), {'🚀': 0})
+    assert cache.get(b) is None
+    assert cache.get(a) == (('GME',), {'🚀': 1})
+
+
+def test_put_of_existing_key_evicts_nothing():
+    cache = TickerCache(max_size=2)
+    a, b = TickerCache.key('a'), TickerCache.key('b')
+    cache.put(a, ('GME',), {})
+    cache.put(b, ('AMC',), {})
+    cache.put(a, ('GME', 'AMC'), {})
+    assert len(cache) == 2
+    assert cache.get(b) == (('AMC',), {})
+    assert cache.get(a) == (('GME', 'AMC'), {})
+
+
+def test_key_separates_texts():
+    assert TickerCache.key('GME', 'AMC') != TickerCache.key('GMEAMC', '')
+
+
+def test_saved_cache_is_reloaded_in_order(tmp_path):
+    filename = str(tmp_path / 'cache.json')
+    cache = TickerCache(filename, max_size=3)
+    keys = [TickerCache.key(text) for text in ('a', 'b', 'c')]
+    for key in keys:
+        cache.put(key, ('GME',), {'🚀': 2})
+    cache.get(keys[0])
+    cache.save()
+
+    reloaded = TickerCache(filename, max_size=3)
+    assert len(reloaded) == 3
+    assert reloaded.get(keys[2]) == (('GME',), {'🚀': 2})
+    reloaded.put(TickerCache.key('d'), (), {})
+    # 'b' is now the least recently used entry
+    assert reloaded.get(keys[1]) is None
+
+
+def test_pickle_file_is_not_loaded(tmp_path):
+    filename = tmp_path / 'cache'
+    filename.write_bytes(pickle.dumps({b'key': (('GME',), {})}))
+    with pytest.warns(UserWarning, match='unreadable'):
+        cache = TickerCache(str(filename))
+    assert len(cache) == 0